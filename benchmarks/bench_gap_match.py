@@ -0,0 +1,39 @@
+"""
+Per-profile latency of role matching in analyze_gaps / rank_roles.
+
+Compares the old per-skill substring scan over every requirement with the
+precomputed SkillMatcher cover matrix, one profile at a time and as a batch.
+
+    python benchmarks/bench_gap_match.py
+"""
+
+import os, random, sys, timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import ALL_TECH, ROLE_INDEX, SKILL_MATCHER, rank_roles, score_profiles
+
+
+def covered_by_substring(skills: list) -> set:
+    """The previous implementation: a skill covers a requirement if either name contains the other."""
+    return {r for s in skills for r in SKILL_MATCHER.required if s.lower() == r or r in s.lower() or s.lower() in r}
+
+
+def rank_by_substring(profile: dict) -> list:
+    covered = covered_by_substring(profile["skills"])
+    return sorted(((len(ix["keys"] & covered), role) for role, ix in ROLE_INDEX.items()), reverse=True)
+
+
+def bench(fn, runs: int) -> float:
+    return timeit.timeit(fn, number=runs) / runs * 1000
+
+
+if __name__ == "__main__":
+    random.seed(7)
+    print(f"{'profiles':>8}  {'substring ms/profile':>20}  {'rank_roles ms/profile':>21}  {'score_profiles ms/profile':>25}")
+    for n in (1, 100, 10000):
+        profiles = [{"skills": random.sample(ALL_TECH, random.randint(3, 15))} for _ in range(n)]
+        runs = max(3, 2000 // n)
+        old  = bench(lambda: [rank_by_substring(p) for p in profiles], runs) / n
+        one  = bench(lambda: [rank_roles(p) for p in profiles], runs) / n
+        many = bench(lambda: score_profiles(profiles), runs) / n
+        print(f"{n:>8}  {old:>20.4f}  {one:>21.4f}  {many:>25.4f}")
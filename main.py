@@ -16,18 +16,32 @@ Full Feature Set:
   8. /chat               — Agentic career mentor chat
 """
 
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter, ValidationError
 from typing import List, Optional
-import json, os, re, io, uuid, asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import json, os, re, uuid, asyncio, time, tempfile, hashlib, sqlite3, threading, heapq, itertools, random
+import base64, zlib, logging, zipfile
+from collections import OrderedDict, Counter, deque
+from contextvars import ContextVar
 from datetime import datetime, timedelta
 import pdfplumber
 import httpx
+import numpy as np
 from dotenv import load_dotenv
-from groq import AsyncGroq
+from groq import AsyncGroq, APIConnectionError
 
 load_dotenv()
+log = logging.getLogger("vidyaguide")
+
+try:
+    import h2  # noqa: F401  — installed by httpx[http2]; enables HTTP/2 on upstream clients
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
 
 # ── Config ────────────────────────────────────────────────────────────────────
 GROQ_API_KEY   = os.getenv("GROQ_API_KEY", "")
@@ -38,19 +52,217 @@ MODEL_SMART    = "llama-3.3-70b-versatile"                   # for complex tasks
 ADZUNA_APP_ID  = os.getenv("ADZUNA_APP_ID", "")
 ADZUNA_APP_KEY = os.getenv("ADZUNA_APP_KEY", "")
 
-app = FastAPI(title="VidyaGuide API v6.0", version="6.0.0")
+# PDF extraction pool — keeps pdfplumber off the event loop
+PDF_WORKERS     = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_QUEUE_LIMIT = int(os.getenv("PDF_QUEUE_LIMIT", str(PDF_WORKERS * 4)))   # in-flight cap → 429
+PDF_MAX_PAGES   = int(os.getenv("PDF_MAX_PAGES", "10"))
+PDF_TIMEOUT     = float(os.getenv("PDF_TIMEOUT", "15"))                    # seconds per file
+PDF_MAX_BYTES   = int(os.getenv("PDF_MAX_BYTES", str(10 * 1024 * 1024)))
+RESUME_MAX_CHARS = int(os.getenv("RESUME_MAX_CHARS", "20000"))             # stop extracting past this
+UPLOAD_CHUNK    = 64 * 1024
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "500"))          # PDFs per /batch-analyze call
+BATCH_MAX_ZIP_BYTES = int(os.getenv("BATCH_MAX_ZIP_BYTES", str(1024 * 1024 * 1024)))   # per uploaded ZIP
+
+# Content-addressed caches (entries; PDF cache is also capped by stored text size)
+PDF_CACHE_SIZE     = int(os.getenv("PDF_CACHE_SIZE", "256"))
+PDF_CACHE_MAX_MB   = int(os.getenv("PDF_CACHE_MAX_MB", "32"))
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "1024"))
+GAP_CACHE_SIZE     = int(os.getenv("GAP_CACHE_SIZE", "4096"))
+
+# LLM response cache — opt-in: off | memory | sqlite
+LLM_CACHE      = os.getenv("LLM_CACHE", "off").lower()
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "2048"))
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite3")
+# endpoint → TTL seconds; endpoints not listed (e.g. chat) are never cached
+LLM_CACHE_POLICY = {"evaluate-answer": 3600, "tailor-resume": 3600, "generate-projects": 900, "generate-schedule": 1800}
+LLM_CACHE_POLICY.update(json.loads(os.getenv("LLM_CACHE_POLICY", "{}")))
+# Prompt budgets — whole-prompt input tokens and max output tokens per endpoint
+PROMPT_BUDGETS = {"tailor-resume":      {"input": 1600, "output": 1200},
+                  "generate-questions": {"input": 1000, "output": 1000},
+                  "evaluate-answer":    {"input": 1500, "output": 800},
+                  "generate-projects":  {"input": 900,  "output": 1500},
+                  "generate-schedule":  {"input": 900,  "output": 1500},
+                  "chat":               {"input": 1400, "output": 400},
+                  "chat-memory":        {"input": 900,  "output": 160},
+                  "json-repair":        {"input": 2500, "output": 1500},
+                  "evaluate-batch":     {"input": 3500, "output": 2400},
+                  "interview-follow-up": {"input": 900, "output": 80}}
+for _ep, _b in json.loads(os.getenv("PROMPT_BUDGETS", "{}")).items():
+    PROMPT_BUDGETS.setdefault(_ep, {}).update(_b)
+DIGEST_TOKENS = int(os.getenv("DIGEST_TOKENS", "300"))     # resume digest shared by tailor/questions/chat
+LLM_JSON_REPAIR = os.getenv("LLM_JSON_REPAIR", "1") == "1"  # one fast-model repair for schema-invalid output
+
+# Upstream HTTP (Adzuna) — one pooled client per upstream, guarded by a circuit breaker
+UPSTREAM_TIMEOUT       = float(os.getenv("UPSTREAM_TIMEOUT", "10"))
+UPSTREAM_MAX_CONNS     = int(os.getenv("UPSTREAM_MAX_CONNS", "20"))        # per upstream host
+BREAKER_FAILURES       = int(os.getenv("BREAKER_FAILURES", "5"))           # consecutive failures to open
+BREAKER_COOLDOWN       = float(os.getenv("BREAKER_COOLDOWN", "30"))        # seconds before a trial request
+
+# Job search cache — (role, location, page) → normalised Adzuna listings
+JOB_CACHE_SIZE     = int(os.getenv("JOB_CACHE_SIZE", "512"))
+JOB_CACHE_FRESH    = int(os.getenv("JOB_CACHE_FRESH", "900"))      # seconds served without refresh
+JOB_CACHE_STALE    = int(os.getenv("JOB_CACHE_STALE", "21600"))    # served while refreshing in background
+JOB_PAGE_SIZE      = int(os.getenv("JOB_PAGE_SIZE", "20"))         # listings fetched per page, re-ranked locally
+JOB_PREFETCH       = os.getenv("JOB_PREFETCH", "1") == "1"         # next page + built-in roles at startup
+JOB_PREFETCH_LOCATION = os.getenv("JOB_PREFETCH_LOCATION", "India")
+
+# Session store — memory (single worker) or sqlite (shared by every worker on the host)
+SESSION_STORE   = os.getenv("SESSION_STORE", "memory").lower()
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "sessions.sqlite3")
+SESSION_TTL     = int(os.getenv("SESSION_TTL", str(24 * 3600)))   # idle seconds before expiry
+SESSION_MAX     = int(os.getenv("SESSION_MAX", "5000"))
+SESSION_MAX_MB  = int(os.getenv("SESSION_MAX_MB", "256"))          # memory backend only
+CHAT_WINDOW     = int(os.getenv("CHAT_WINDOW", "6"))               # messages kept verbatim; older ones are summarised
+
+# Background tasks — /generate-projects and /generate-schedule submitted via /<endpoint>/async
+TASK_WORKERS     = int(os.getenv("TASK_WORKERS", "4"))
+TASK_QUEUE_LIMIT = int(os.getenv("TASK_QUEUE_LIMIT", "100"))      # queued tasks before 429
+TASK_KEEP        = int(os.getenv("TASK_KEEP", "1000"))            # finished tasks kept for polling
+REPORT_BRANCH_TIMEOUT = float(os.getenv("REPORT_BRANCH_TIMEOUT", "20"))   # seconds per /full-report branch
+# Pre-generation — warm questions/projects/schedule right after /analyze (opt-in)
+PREGENERATE          = os.getenv("PREGENERATE", "0") == "1"    # default for AnalyzeRequest.pregenerate
+PREGENERATE_PRIORITY = int(os.getenv("PREGENERATE_PRIORITY", "3"))   # scheduler lane, behind every real request
+# Load shedding — serve generators from the rule engine when Groq is backed up
+SHED_MODE        = os.getenv("SHED_MODE", "auto").lower()          # auto | always | off
+SHED_QUEUE_DEPTH = int(os.getenv("SHED_QUEUE_DEPTH", "20"))        # waiters in a model's scheduler
+SHED_P95_MS      = float(os.getenv("SHED_P95_MS", "20000"))        # recent p95 latency of a model
+# Live interview — follow-up questions speculated from interim transcripts
+FOLLOWUP_MIN_WORDS   = int(os.getenv("FOLLOWUP_MIN_WORDS", "8"))       # partial answer length before speculating
+FOLLOWUP_STEP_WORDS  = int(os.getenv("FOLLOWUP_STEP_WORDS", "12"))     # new words before re-speculating
+FOLLOWUP_REUSE_RATIO = float(os.getenv("FOLLOWUP_REUSE_RATIO", "0.7")) # share of the final answer the guess must have seen
+
+# Groq scheduling — per-model concurrency + requests/minute, retries on 429/503
+LLM_CONCURRENCY_FAST  = int(os.getenv("LLM_CONCURRENCY_FAST", "8"))
+LLM_CONCURRENCY_SMART = int(os.getenv("LLM_CONCURRENCY_SMART", "4"))
+LLM_RPM_FAST          = float(os.getenv("LLM_RPM_FAST", "30"))
+LLM_RPM_SMART         = float(os.getenv("LLM_RPM_SMART", "30"))
+LLM_MAX_RETRIES       = int(os.getenv("LLM_MAX_RETRIES", "3"))
+# Model routing — smart-model requests drop to MODEL_NAME when it is slow, failing or over budget
+LLM_SMART_P95_MS         = float(os.getenv("LLM_SMART_P95_MS", "12000"))
+LLM_SMART_MAX_ERROR_RATE = float(os.getenv("LLM_SMART_MAX_ERROR_RATE", "0.3"))
+LLM_ROUTER_WINDOW        = int(os.getenv("LLM_ROUTER_WINDOW", "50"))       # recent calls per model
+LLM_ROUTER_MAX_AGE       = float(os.getenv("LLM_ROUTER_MAX_AGE", "120"))   # seconds before a sample stops counting
+LLM_LATENCY_BUDGET_MS    = {"tailor-resume": 10000, "generate-questions": 8000,
+                            "generate-projects": 15000, "generate-schedule": 15000}
+LLM_LATENCY_BUDGET_MS.update(json.loads(os.getenv("LLM_LATENCY_BUDGET_MS", "{}")))
+# lower runs first: interactive chat/evaluation ahead of batch generation
+LLM_PRIORITY = {"chat": 0, "evaluate-answer": 0, "evaluate-batch": 0, "generate-questions": 1, "tailor-resume": 1,
+                "generate-projects": 2, "generate-schedule": 2, "chat-memory": 2, "json-repair": 0}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    for upstream in upstreams.values():
+        upstream.start()
+    if JOB_PREFETCH and ADZUNA_APP_ID and ADZUNA_APP_KEY:
+        for role in ROLE_REQUIREMENTS:
+            job_cache.prefetch(role, JOB_PREFETCH_LOCATION, 1)
+    task_queue.start()
+    yield
+    await task_queue.close()
+    for upstream in upstreams.values():
+        await upstream.close()
+    if _pdf_pool is not None:
+        _pdf_pool.shutdown(wait=False, cancel_futures=True)
+
+
+app = FastAPI(title="VidyaGuide API v6.0", version="6.0.0", lifespan=lifespan)
+
+
+@app.middleware("http")
+async def record_llm_models(request, call_next):
+    """Expose the model(s) that served this request as X-LLM-Model."""
+    trace = []
+    llm_trace.set(trace)
+    response = await call_next(request)
+    if trace:
+        response.headers["X-LLM-Model"] = ",".join(dict.fromkeys(t["model"] for t in trace))
+    return response
+
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-LLM-Model"],
 )
 
-sessions: dict = {}
-
 # ── Groq LLM Client ───────────────────────────────────────────────────────────
-groq_client = AsyncGroq(api_key=GROQ_API_KEY) if GROQ_API_KEY else None
+# retries are handled by groq_create so they go back through the scheduler
+groq_client = AsyncGroq(api_key=GROQ_API_KEY, max_retries=0) if GROQ_API_KEY else None
+
+# Single-flight: identical prompts issued concurrently share one Groq request
+_inflight: dict = {}
+llm_stats = {"requests": 0, "groq_calls": 0, "coalesced": 0}
+
+
+# LLM calls made for the current HTTP request; a fresh list is set by the record_llm_models middleware
+llm_trace: ContextVar[list | None] = ContextVar("llm_trace", default=None)
+llm_spend: ContextVar[Counter | None] = ContextVar("llm_spend", default=None)   # tokens billed to the current task
+
+
+def trace_llm(endpoint: str, model: str):
+    if (trace := llm_trace.get()) is not None:
+        trace.append({"endpoint": endpoint, "model": model})
+
+
+def served_model() -> str:
+    trace = llm_trace.get()
+    return trace[-1]["model"] if trace else MODEL_NAME
+
+
+async def _call_model(model: str, system: str, user: str, temperature: float, max_tokens: int, endpoint: str,
+                      priority: int | None = None) -> str:
+    llm_stats["groq_calls"] += 1
+    async with scheduler_for(model).slot(LLM_PRIORITY.get(endpoint, 1) if priority is None else priority):
+        t0 = time.monotonic()
+        try:
+            resp, t0 = await groq_create(
+                model,
+                messages=[
+                    {"role": "system", "content": system},
+                    {"role": "user",   "content": user},
+                ],
+                temperature=temperature,
+                max_tokens=max_tokens,
+            )
+        except Exception:
+            router.observe(model, (time.monotonic() - t0) * 1000, 0, ok=False)
+            raise
+    ms    = (time.monotonic() - t0) * 1000
+    text  = resp.choices[0].message.content.strip()
+    usage = getattr(resp, "usage", None)
+    tokens_in  = getattr(usage, "prompt_tokens", 0) or estimate_tokens(system) + estimate_tokens(user)
+    tokens_out = getattr(usage, "completion_tokens", 0) or estimate_tokens(text)
+    router.observe(model, ms, tokens_in + tokens_out, ok=True)
+    record_tokens(endpoint, model, tokens_in, tokens_out, ms)
+    if (spend := llm_spend.get()) is not None:
+        spend["tokens"] += tokens_in + tokens_out
+    return text
+
+
+async def _complete(model: str, system: str, user: str, temperature: float, max_tokens: int, endpoint: str,
+                    priority: int | None = None) -> tuple[str, str]:
+    """Returns (text, model that served it); a failed smart call is retried once on MODEL_NAME.
+
+    Output for endpoints with a response schema comes back validated (and repaired if needed).
+    """
+    try:
+        text = await _call_model(model, system, user, temperature, max_tokens, endpoint, priority)
+    except Exception:
+        if model == MODEL_NAME: raise
+        router.stats["fallback_errors"] += 1
+        model = MODEL_NAME
+        text  = await _call_model(model, system, user, temperature, max_tokens, endpoint, priority)
+    return await ensure_json(endpoint, text), model
+
+
+def _forget_inflight(key: str, task: asyncio.Task):
+    _inflight.pop(key, None)
+    if not task.cancelled(): task.exception()   # mark retrieved even if every waiter went away
+
 
 async def ask_llm(
     system: str,
@@ -58,37 +270,1349 @@ async def ask_llm(
     temperature: float = 0.4,
     max_tokens: int = 1500,
     smart: bool = False,
+    endpoint: str = "",
 ) -> str:
     if not GROQ_API_KEY or not groq_client:
         raise HTTPException(
             500,
             "GROQ_API_KEY not set. Get your free key at https://console.groq.com"
         )
-    model = MODEL_SMART if smart else MODEL_NAME
-    resp = await groq_client.chat.completions.create(
-        model=model,
-        messages=[
-            {"role": "system", "content": system},
-            {"role": "user",   "content": user},
-        ],
-        temperature=temperature,
-        max_tokens=max_tokens,
-    )
-    return resp.choices[0].message.content.strip()
-
-
-def safe_json(text: str) -> dict | list:
-    cleaned = re.sub(r"```json|```", "", text).strip()
+    prompt_tokens, max_tokens = apply_budget(endpoint, system, user, max_tokens)
+    model = router.choose(smart, endpoint, prompt_tokens, max_tokens)
+    ttl   = LLM_CACHE_POLICY.get(endpoint) if llm_cache else None
+    key   = llm_cache_key(model, system, user, temperature, max_tokens)
+    llm_stats["requests"] += 1
+    if ttl and (hit := await llm_cache_get(key)) is not None:
+        trace_llm(endpoint, "cache")
+        return hit
+    task = _inflight.get(key)
+    if task is None:
+        # a detached task, so a client disconnecting doesn't cancel the call for everyone else
+        task = _inflight[key] = asyncio.ensure_future(
+            _complete(model, system, user, temperature, max_tokens, endpoint))
+        task.add_done_callback(lambda t: _forget_inflight(key, t))
+    else:
+        llm_stats["coalesced"] += 1
+    text, served = await asyncio.shield(task)
+    trace_llm(endpoint, served)
+    if ttl and (entry := cacheable(endpoint, text)):
+        await llm_cache_set(key, entry, ttl)
+    return text
+
+
+async def ask_llm_stream(
+    system: str,
+    user: str,
+    temperature: float = 0.4,
+    max_tokens: int = 1500,
+    smart: bool = False,
+    endpoint: str = "",
+):
+    """Like ask_llm, but yields content deltas as Groq produces them."""
+    if not GROQ_API_KEY or not groq_client:
+        raise HTTPException(
+            500,
+            "GROQ_API_KEY not set. Get your free key at https://console.groq.com"
+        )
+    prompt_tokens, max_tokens = apply_budget(endpoint, system, user, max_tokens)
+    model = router.choose(smart, endpoint, prompt_tokens, max_tokens)
+    ttl   = LLM_CACHE_POLICY.get(endpoint) if llm_cache else None
+    if ttl:
+        key = llm_cache_key(model, system, user, temperature, max_tokens)
+        if (hit := await llm_cache_get(key)) is not None:
+            trace_llm(endpoint, "cache")
+            yield hit
+            return
+    # the upstream stream is drained into a queue by its own task, so the scheduler slot
+    # is released when Groq finishes rather than when a slow client finishes reading
+    queue   = asyncio.Queue()
+    started = asyncio.get_running_loop().create_future()   # → the model that accepted the request
+    pump    = asyncio.ensure_future(_pump_stream(model, system, user, temperature, max_tokens, endpoint,
+                                                 prompt_tokens, queue, started))
+
+    def pump_done(task: asyncio.Task):   # an unexpected error in the pump must still wake the reader
+        if task.cancelled() or (err := task.exception()) is None: return
+        if started.done(): queue.put_nowait(err)
+        else: started.set_exception(err)
+
+    pump.add_done_callback(pump_done)
+    parts = []
     try:
-        return json.loads(cleaned)
-    except Exception:
-        m = re.search(r"[\[\{].*[\]\}]", cleaned, re.DOTALL)
-        if m:
+        trace_llm(endpoint, await started)
+        while (delta := await queue.get()) is not None:
+            if isinstance(delta, Exception): raise delta
+            parts.append(delta)
+            yield delta
+    finally:
+        pump.cancel()
+    if ttl and (entry := cacheable(endpoint, "".join(parts).strip())):
+        await llm_cache_set(key, entry, ttl)
+
+
+async def _pump_stream(model: str, system: str, user: str, temperature: float, max_tokens: int, endpoint: str,
+                       prompt_tokens: int, queue: asyncio.Queue, started: asyncio.Future):
+    """Feed one streamed completion into queue (deltas, then None, or an exception).
+
+    Like _complete, a smart-model request that fails before streaming is retried once
+    on MODEL_NAME, and outcomes are recorded with the router.
+    """
+    while True:
+        async with scheduler_for(model).slot(LLM_PRIORITY.get(endpoint, 1)):
+            t0 = time.monotonic()
+            try:
+                stream, t0 = await groq_create(
+                    model,
+                    messages=[
+                        {"role": "system", "content": system},
+                        {"role": "user",   "content": user},
+                    ],
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    stream=True,
+                )
+            except Exception as e:
+                router.observe(model, (time.monotonic() - t0) * 1000, 0, ok=False)
+                if model == MODEL_NAME:
+                    started.set_exception(e)
+                    return
+                router.stats["fallback_errors"] += 1
+                model = MODEL_NAME
+                continue
+            started.set_result(model)
+            parts = []
+            try:
+                async for chunk in stream:
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        parts.append(delta)
+                        queue.put_nowait(delta)
+            except Exception as e:
+                router.observe(model, (time.monotonic() - t0) * 1000, 0, ok=False)
+                queue.put_nowait(e)
+                return
+            ms, tokens_out = (time.monotonic() - t0) * 1000, estimate_tokens("".join(parts))
+            router.observe(model, ms, prompt_tokens + tokens_out, ok=True)
+            record_tokens(endpoint, model, prompt_tokens, tokens_out, ms)
+        queue.put_nowait(None)
+        return
+
+
+class JsonStreamScanner:
+    """Incremental bracket scanner over LLM output.
+
+    feed() returns each top-level array element (or, for an object, each
+    {"key": value} member) as soon as it is complete, ignoring code fences
+    and prose before the first bracket.
+    """
+
+    def __init__(self):
+        self.root, self.depth, self.in_str, self.esc, self.done = None, 0, False, False, False
+        self.buf: list = []
+
+    def feed(self, chunk: str) -> list:
+        out = []
+        for ch in chunk:
+            if self.done: break
+            if self.root is None:
+                if ch in "[{": self.root, self.depth = ch, 1
+                continue
+            if self.in_str:
+                if self.esc: self.esc = False
+                elif ch == "\\": self.esc = True
+                elif ch == '"': self.in_str = False
+            elif ch == '"': self.in_str = True
+            elif ch in "[{": self.depth += 1
+            elif ch in "]}":
+                self.depth -= 1
+                if self.depth == 0:
+                    self._flush(out); self.done = True
+                    continue
+            elif ch == "," and self.depth == 1:
+                self._flush(out)
+                continue
+            self.buf.append(ch)
+        return out
+
+    def _flush(self, out: list):
+        piece, self.buf = "".join(self.buf).strip(), []
+        if not piece: return
+        try:
+            out.append(json.loads(piece if self.root == "[" else "{" + piece + "}"))
+        except ValueError:
+            pass
+
+
+_JSON_TOKEN_RE = re.compile(r'[\[\]{}"\\]')
+_CLOSER = {"]": "[", "}": "{"}
+
+
+def json_values(text: str):
+    """Yield every bracket-balanced span that parses as JSON, in order of position.
+
+    One pass pairs brackets (ignoring those inside strings, and quotes in prose
+    outside any bracket), so a stray "[1" before the payload, code fences or a
+    cut-off tail don't hide a complete value elsewhere in the text.
+    """
+    stack, spans, in_str, esc = [], [], False, False
+    for m in _JSON_TOKEN_RE.finditer(text):
+        ch, i = m.group(), m.start()
+        if in_str:
+            if esc and i == esc: pass              # escaped character
+            elif ch == "\\": esc = i + 1
+            elif ch == '"': in_str = False
+            continue
+        if ch == '"':
+            in_str = bool(stack)
+        elif ch in "[{":
+            stack.append((ch, i))
+        elif ch in "]}" and stack:
+            # tolerate a mismatched closer by unwinding to its opener, if any
+            depth = next((d for d in range(len(stack) - 1, -1, -1) if stack[d][0] == _CLOSER[ch]), None)
+            if depth is None: continue
+            spans.append((stack[depth][1], i + 1))
+            del stack[depth:]
+    for start, end in sorted(spans):
+        try:
+            yield json.loads(text[start:end])
+        except ValueError:
+            continue
+
+
+# Endpoints with a response schema (RESPONSE_SCHEMAS, next to the request models)
+# are validated before they reach the *_finish step; invalid output gets one repair
+# pass on the fast model instead of silently falling back to canned content.
+json_stats: dict = {}   # endpoint → Counter(ok, repaired, failed)
+
+
+def parse_structured(endpoint: str, text: str) -> tuple:
+    """(validated JSON-able value, None) or (None, reason).
+
+    Candidates are tried in order, so prose like "Here are [3] questions:" ahead of
+    the payload doesn't shadow it.
+    """
+    adapter, error = RESPONSE_SCHEMAS[endpoint], None
+    for value in json_values(text):
+        try:
+            return adapter.dump_python(adapter.validate_python(value)), None
+        except ValidationError as e:
+            error = error or str(e)[:600]
+    return None, error or "no complete JSON value found"
+
+
+def parse_json(endpoint: str, text: str):
+    return parse_structured(endpoint, text)[0]
+
+
+async def ensure_json(endpoint: str, text: str) -> str:
+    """Schema-valid JSON text for endpoint, after at most one repair call; unchanged text if both fail."""
+    if endpoint not in RESPONSE_SCHEMAS: return text
+    stats = json_stats.setdefault(endpoint, Counter())
+    value, error = parse_structured(endpoint, text)
+    if value is None and LLM_JSON_REPAIR and text:
+        schema = json.dumps(RESPONSE_SCHEMAS[endpoint].json_schema(), separators=(",", ":"))
+        try:
+            fixed = await ask_llm(**build_prompt(
+                "json-repair",
+                "You repair malformed JSON produced by another model. Return ONLY the corrected JSON value — "
+                "no prose, no code fences. Keep the original content; only fix structure and types.",
+                f"JSON schema:\n{schema}\n\nProblem: {error}\n\nOutput to repair:\n<<output>>", {"output": text},
+                temperature=0.0, max_tokens=PROMPT_BUDGETS.get(endpoint, {}).get("output", 1500)))
+            value, _ = parse_structured(endpoint, fixed)
+        except Exception as e:
+            log.warning("JSON repair for %s failed: %r", endpoint, e)
+        stats["repaired" if value is not None else "failed"] += 1
+    elif value is None:
+        stats["failed"] += 1
+    else:
+        stats["ok"] += 1
+    if value is None:
+        log.warning("%s returned unusable JSON: %s", endpoint, error)
+        return text
+    return json.dumps(value)
+
+
+def cacheable(endpoint: str, text: str) -> str:
+    """What the LLM cache may store for text: "" if it's empty or fails the endpoint's schema.
+
+    ensure_json hands back unusable output unchanged after a failed repair; caching
+    it would replay the endpoint's canned fallback for the whole TTL.
+    """
+    if not text or endpoint not in RESPONSE_SCHEMAS: return text
+    value = parse_json(endpoint, text)
+    return json.dumps(value) if value is not None else ""
+
+
+def json_metrics() -> dict:
+    return {ep: {**c, "parse_failure_rate": round((c["repaired"] + c["failed"]) / max(1, sum(c.values())), 3)}
+            for ep, c in json_stats.items()}
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CACHES
+# ═══════════════════════════════════════════════════════════════════════════════
+class LRUCache:
+    """Bounded LRU map with hit/miss counters. Values are shared — treat them as read-only."""
+
+    def __init__(self, max_entries: int, max_bytes: int = 0, sizeof=None):
+        self.max_entries, self.max_bytes = max_entries, max_bytes
+        self.sizeof = sizeof or (lambda v: 0)
+        self.data: OrderedDict = OrderedDict()
+        self.bytes = self.hits = self.misses = self.evictions = 0
+
+    def get(self, key):
+        if key in self.data:
+            self.hits += 1
+            self.data.move_to_end(key)
+            return self.data[key][0]
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        if key in self.data:
+            self.bytes -= self.data.pop(key)[1]
+        size = self.sizeof(value)
+        self.data[key] = (value, size)
+        self.bytes += size
+        while self.data and (len(self.data) > self.max_entries or (self.max_bytes and self.bytes > self.max_bytes)):
+            self.bytes -= self.data.popitem(last=False)[1][1]
+            self.evictions += 1
+        return value
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"entries": len(self.data), "bytes": self.bytes, "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "hit_rate": round(self.hits/total, 3) if total else 0.0}
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+pdf_cache     = LRUCache(PDF_CACHE_SIZE, PDF_CACHE_MAX_MB * 1024 * 1024, sizeof=lambda r: len(r["text"]))
+profile_cache = LRUCache(PROFILE_CACHE_SIZE)
+gap_cache     = LRUCache(GAP_CACHE_SIZE)
+digest_cache  = LRUCache(PROFILE_CACHE_SIZE)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# LLM RESPONSE CACHE
+# ═══════════════════════════════════════════════════════════════════════════════
+def llm_cache_key(model: str, system: str, user: str, temperature: float, max_tokens: int) -> str:
+    return text_hash(json.dumps([model, system, user, temperature, max_tokens]))
+
+
+class MemoryResponseCache(LRUCache):
+    """In-process LRU of completions with a per-entry TTL."""
+
+    def get(self, key):
+        entry = super().get(key)
+        if entry is None: return None
+        expires, text = entry
+        if expires < time.time():
+            self.hits -= 1; self.misses += 1
+            self.bytes -= self.data.pop(key)[1]
+            return None
+        return text
+
+    def set(self, key: str, text: str, ttl: float):
+        self.put(key, (time.time() + ttl, text))
+
+
+class SqliteResponseCache:
+    """On-disk completions shared by every worker on the host (WAL mode).
+
+    Calls block on disk and on other workers' write locks, so async code goes through
+    llm_cache_get / llm_cache_set, which run them on a thread.
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        self.max_entries, self.hits, self.misses = max_entries, 0, 0
+        self.lock = threading.Lock()
+        self.db   = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")   # no fsync per write; a crash can only lose recent cache entries
+        self.db.execute("CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, text TEXT, expires REAL, used REAL)")
+
+    def get(self, key: str):
+        now = time.time()
+        with self.lock:
+            row = self.db.execute("SELECT text FROM llm_cache WHERE key=? AND expires>?", (key, now)).fetchone()
+            if row: self.db.execute("UPDATE llm_cache SET used=? WHERE key=?", (now, key))
+        if row: self.hits += 1; return row[0]
+        self.misses += 1
+        return None
+
+    def set(self, key: str, text: str, ttl: float):
+        now = time.time()
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO llm_cache VALUES (?,?,?,?)", (key, text, now + ttl, now))
+            self.db.execute("DELETE FROM llm_cache WHERE expires<=? OR key IN (SELECT key FROM llm_cache "
+                            "ORDER BY used DESC LIMIT -1 OFFSET ?)", (now, self.max_entries))
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        with self.lock:
+            entries = self.db.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        return {"entries": entries, "hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits/total, 3) if total else 0.0}
+
+
+llm_cache = (MemoryResponseCache(LLM_CACHE_SIZE) if LLM_CACHE == "memory" else
+             SqliteResponseCache(LLM_CACHE_PATH, LLM_CACHE_SIZE) if LLM_CACHE == "sqlite" else None)
+
+
+async def llm_cache_get(key: str):
+    if isinstance(llm_cache, SqliteResponseCache): return await asyncio.to_thread(llm_cache.get, key)
+    return llm_cache.get(key)
+
+
+async def llm_cache_set(key: str, text: str, ttl: float):
+    if isinstance(llm_cache, SqliteResponseCache): return await asyncio.to_thread(llm_cache.set, key, text, ttl)
+    llm_cache.set(key, text, ttl)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# LLM SCHEDULER
+# ═══════════════════════════════════════════════════════════════════════════════
+class ModelScheduler:
+    """Concurrency cap + token bucket for one Groq model, with priority lanes for waiters."""
+
+    def __init__(self, model: str, concurrency: int, rpm: float):
+        self.model, self.free, self.rate = model, concurrency, rpm / 60
+        self.tokens, self.capacity, self.refilled = float(concurrency), float(concurrency), time.monotonic()
+        self.waiters: list = []   # heap of (priority, seq, future)
+        self.seq = itertools.count()
+        self.stats = {"concurrency": concurrency, "rpm": rpm, "in_flight": 0, "acquired": 0,
+                      "wait_ms_total": 0.0, "wait_ms_max": 0.0, "retries": 0, "throttled": 0}
+
+    async def _take_token(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.refilled) * self.rate)
+        self.refilled = now
+        self.tokens -= 1          # reserve first; a negative balance is the wait owed
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
+
+    def _release(self):
+        while self.waiters:
+            fut = heapq.heappop(self.waiters)[2]
+            if not fut.done():
+                fut.set_result(None); return
+        self.free += 1
+
+    @asynccontextmanager
+    async def slot(self, priority: int = 1):
+        t0 = time.monotonic()
+        if self.free > 0 and not self.waiters:
+            self.free -= 1
+        else:
+            fut = asyncio.get_running_loop().create_future()
+            heapq.heappush(self.waiters, (priority, next(self.seq), fut))
             try:
-                return json.loads(m.group())
+                await fut
+            except asyncio.CancelledError:
+                if not fut.cancelled(): self._release()   # slot was handed over as we left
+                raise
+        wait = (time.monotonic() - t0) * 1000
+        self.stats["acquired"] += 1
+        self.stats["wait_ms_total"] += wait
+        self.stats["wait_ms_max"] = max(self.stats["wait_ms_max"], wait)
+        self.stats["in_flight"] += 1
+        try:
+            yield
+        finally:
+            self.stats["in_flight"] -= 1
+            self._release()
+
+    def metrics(self) -> dict:
+        n = self.stats["acquired"]
+        return {**self.stats, "queued": sum(1 for w in self.waiters if not w[2].done()),
+                "wait_ms_avg": round(self.stats["wait_ms_total"]/n, 2) if n else 0.0}
+
+
+schedulers = {MODEL_NAME: ModelScheduler(MODEL_NAME, LLM_CONCURRENCY_FAST, LLM_RPM_FAST),
+              MODEL_SMART: ModelScheduler(MODEL_SMART, LLM_CONCURRENCY_SMART, LLM_RPM_SMART)}
+
+
+def scheduler_for(model: str) -> ModelScheduler:
+    return schedulers.get(model) or schedulers[MODEL_NAME]
+
+
+def _retry_after(e: Exception, attempt: int) -> float:
+    response = getattr(e, "response", None)
+    try:
+        delay = float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        delay = 0.5 * 2 ** attempt
+    return min(20.0, delay) + random.uniform(0, 0.25 * delay + 0.1)
+
+
+async def groq_create(model: str, **kwargs):
+    """chat.completions.create with the bucket applied per attempt and jittered retries.
+
+    Retries what the SDK would have (connection errors and timeouts, 408, 409, 429, 5xx).
+
+    Returns (response, start of the successful attempt), so latency samples exclude bucket and retry waits.
+    """
+    sched = scheduler_for(model)
+    for attempt in itertools.count():
+        await sched._take_token()
+        try:
+            started = time.monotonic()
+            return await groq_client.chat.completions.create(model=model, **kwargs), started
+        except Exception as e:
+            status = getattr(e, "status_code", None)
+            if status == 429: sched.stats["throttled"] += 1
+            if not (isinstance(e, APIConnectionError) or status in (408, 409, 429) or (status or 0) >= 500): raise
+            if attempt >= LLM_MAX_RETRIES:
+                raise HTTPException(503, "AI service is busy — please retry shortly.",
+                                    headers={"Retry-After": str(int(_retry_after(e, attempt)) + 1)})
+            sched.stats["retries"] += 1
+            await asyncio.sleep(_retry_after(e, attempt))
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# MODEL ROUTER
+# ═══════════════════════════════════════════════════════════════════════════════
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate Llama-3 token count: one per word piece of ≤7 chars, one per punctuation mark."""
+    return sum(1 + len(t) // 7 for t in _TOKEN_RE.findall(text)) + 1
+
+
+class ModelRouter:
+    """Chooses MODEL_SMART or MODEL_NAME per request from recent latency and error samples.
+
+    Samples older than max_age seconds are ignored, and so is a per-token speed
+    estimate not updated within max_age, so a model that stops getting traffic
+    (diverted, or shed to the rule engine) doesn't keep its old p95 or speed forever.
+    """
+
+    def __init__(self, window: int, max_age: float):
+        self.samples: dict = {}        # model → deque[(at, ms, ok)]
+        self.max_age = max_age
+        self.ms_per_token: dict = {}   # model → (updated at, EWMA of latency per processed token)
+        self.served, self.window = Counter(), window
+        self.stats = Counter()
+
+    def observe(self, model: str, ms: float, tokens: int, ok: bool):
+        self.samples.setdefault(model, deque(maxlen=self.window)).append((time.monotonic(), ms, ok))
+        if ok:
+            self.served[model] += 1
+            if tokens:
+                prev = self.speed(model)
+                rate = ms / tokens
+                self.ms_per_token[model] = (time.monotonic(), rate if prev is None else 0.8*prev + 0.2*rate)
+
+    def speed(self, model: str) -> float | None:
+        """Recent ms per token for model, or None if it hasn't served a call within max_age."""
+        at, rate = self.ms_per_token.get(model, (0.0, None))
+        return rate if time.monotonic() - at <= self.max_age else None
+
+    def recent(self, model: str) -> list:
+        cutoff = time.monotonic() - self.max_age
+        return [(ms, ok) for at, ms, ok in self.samples.get(model, ()) if at >= cutoff]
+
+    def p95(self, model: str) -> float:
+        ms = sorted(m for m, ok in self.recent(model) if ok)
+        return ms[min(len(ms) - 1, int(len(ms) * 0.95))] if ms else 0.0
+
+    def error_rate(self, model: str) -> float:
+        s = self.recent(model)
+        return sum(1 for _, ok in s if not ok) / len(s) if len(s) >= 5 else 0.0
+
+    def choose(self, smart: bool, endpoint: str, prompt_tokens: int, max_tokens: int) -> str:
+        if not smart or MODEL_SMART == MODEL_NAME:
+            return MODEL_NAME
+        reason = None
+        if self.error_rate(MODEL_SMART) > LLM_SMART_MAX_ERROR_RATE:
+            reason = "error_rate"
+        elif self.p95(MODEL_SMART) > LLM_SMART_P95_MS:
+            reason = "p95"
+        elif (budget := LLM_LATENCY_BUDGET_MS.get(endpoint)) and (speed := self.speed(MODEL_SMART)) is not None \
+                and speed * (prompt_tokens + max_tokens) > budget:
+            reason = "budget"
+        if reason:
+            self.stats[f"fallback_{reason}"] += 1
+            # every 10th diverted request still probes the smart model so its stats can recover
+            if self.stats[f"fallback_{reason}"] % 10 == 0:
+                self.stats["probes"] += 1
+                return MODEL_SMART
+            return MODEL_NAME
+        return MODEL_SMART
+
+    def metrics(self) -> dict:
+        return {"served": dict(self.served), "routing": dict(self.stats),
+                "models": {m: {"p95_ms": round(self.p95(m), 1), "error_rate": round(self.error_rate(m), 3),
+                               "ms_per_token": round(self.speed(m) or 0.0, 3)} for m in self.samples}}
+
+
+router = ModelRouter(LLM_ROUTER_WINDOW, LLM_ROUTER_MAX_AGE)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# PROMPT BUDGETS
+# ═══════════════════════════════════════════════════════════════════════════════
+# Prompt builders mark free-form inputs (job descriptions, answers, chat messages)
+# as <<slot>>s; build_prompt clips them at sentence boundaries so the whole prompt
+# fits the endpoint's input budget. ask_llm caps max_tokens at the output budget
+# and records tokens in/out per endpoint.
+token_stats: dict = {}   # endpoint → Counter(calls, tokens_in, tokens_out, over_budget)
+
+# lazy up to a sentence end, so "Node.js", "3.5M" or "e.g." stay inside their piece; pieces always rejoin to the input
+_PIECE_RE = re.compile(r"[^\n]*?(?:[.!?]+(?=\s|$)|\n|$)")
+
+
+def clip_tokens(text: str, limit: int, tail: bool = False) -> str:
+    """Keep whole sentences/lines (from the end if tail) within ~limit tokens."""
+    if estimate_tokens(text) <= limit: return text
+    pieces = [m.group(0) for m in _PIECE_RE.finditer(text) if m.group(0)]
+    if not pieces or limit <= 1: return ""   # nothing to keep, or no room for it (build_prompt can allot 0)
+    if tail: pieces.reverse()
+    kept, used = [], 1
+    for piece in pieces:
+        n = estimate_tokens(piece) - 1
+        if used + n > limit: break
+        kept.append(piece); used += n
+    if not kept:   # a single sentence longer than the limit: fall back to words
+        words = pieces[0].split()
+        if tail: words.reverse()
+        for w in words:
+            n = estimate_tokens(w)
+            if used + n > limit: break
+            kept.append(w + " "); used += n
+    if tail: kept.reverse()
+    clipped = "".join(kept).strip()
+    return "… " + clipped if tail else clipped + " …"
+
+
+def _allot(needs: dict, room: int) -> dict:
+    """Split room across slots: small ones get what they need, the rest share what's left evenly."""
+    out, left = {}, dict(needs)
+    while left:
+        share = max(0, room) // len(left)
+        small = {k: n for k, n in left.items() if n <= share}
+        if not small:
+            return {**out, **{k: share for k in left}}
+        for k, n in small.items():
+            out[k] = n; room -= n; del left[k]
+    return out
+
+
+def build_prompt(endpoint: str, system: str, user: str, fill: dict | None = None, **kwargs) -> dict:
+    """ask_llm kwargs with each <<name>> in user replaced by fill[name], clipped to the input budget.
+
+    Slots named *_tail keep their end (e.g. chat history) rather than their start.
+    """
+    fill = fill or {}
+    if fill:
+        tail  = {k for k in fill if k.endswith("_tail")}
+        fixed = re.sub(r"<<\w+>>", "", user)
+        room  = PROMPT_BUDGETS.get(endpoint, {}).get("input", 1 << 30) - estimate_tokens(system) - estimate_tokens(fixed)
+        limit = _allot({k: estimate_tokens(v) for k, v in fill.items()}, room)
+        for k, v in fill.items():
+            user = user.replace(f"<<{k}>>", clip_tokens(v, limit[k], tail=k in tail))
+    return dict(system=system, user=user, endpoint=endpoint, **kwargs)
+
+
+def apply_budget(endpoint: str, system: str, user: str, max_tokens: int) -> tuple[int, int]:
+    """Returns (prompt tokens, max_tokens capped at the endpoint's output budget)."""
+    budget = PROMPT_BUDGETS.get(endpoint, {})
+    tokens = estimate_tokens(system) + estimate_tokens(user)
+    if tokens > budget.get("input", tokens):
+        token_stats.setdefault(endpoint, Counter())["over_budget"] += 1
+        log.warning("%s prompt is %d tokens, over its %d budget", endpoint, tokens, budget["input"])
+    return tokens, min(max_tokens, budget.get("output", max_tokens))
+
+
+def record_tokens(endpoint: str, model: str, tokens_in: int, tokens_out: int, ms: float):
+    stats = token_stats.setdefault(endpoint or "other", Counter())
+    stats["calls"] += 1; stats["tokens_in"] += tokens_in; stats["tokens_out"] += tokens_out
+    log.info("llm %s model=%s tokens_in=%d tokens_out=%d ms=%.0f", endpoint or "other", model, tokens_in, tokens_out, ms)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# SESSION STORE
+# ═══════════════════════════════════════════════════════════════════════════════
+# Sessions are plain JSON-able dicts. Routes read with session_get(), mutate the dict
+# and write it back with session_put() so that the shared backend sees the change.
+class _SessionEntry:
+    __slots__ = ("session", "expires", "size")
+
+    def __init__(self, session: dict, expires: float, size: int):
+        self.session, self.expires, self.size = session, expires, size
+
+
+class MemorySessionStore:
+    """In-process LRU with sliding TTL, capped by session count and approximate bytes."""
+
+    def __init__(self, ttl: int, max_sessions: int, max_bytes: int):
+        self.ttl, self.max_sessions, self.max_bytes = ttl, max_sessions, max_bytes
+        self.data: OrderedDict = OrderedDict()   # sid → _SessionEntry
+        self.bytes = self.expired = self.evicted = 0
+
+    def get(self, sid: str):
+        entry = self.data.get(sid)
+        if entry is None: return None
+        if entry.expires < time.time():
+            self.delete(sid); self.expired += 1
+            return None
+        entry.expires = time.time() + self.ttl
+        self.data.move_to_end(sid)
+        return entry.session
+
+    def put(self, sid: str, session: dict):
+        size = len(json.dumps(session, default=str))
+        if sid in self.data: self.bytes -= self.data.pop(sid).size
+        self.data[sid] = _SessionEntry(session, time.time() + self.ttl, size)
+        self.bytes += size
+        while len(self.data) > self.max_sessions or self.bytes > self.max_bytes:
+            if len(self.data) == 1: break
+            self.bytes -= self.data.popitem(last=False)[1].size
+            self.evicted += 1
+
+    def delete(self, sid: str):
+        if (entry := self.data.pop(sid, None)) is not None:
+            self.bytes -= entry.size
+
+    def stats(self) -> dict:
+        return {"backend": "memory", "sessions": len(self.data), "bytes": self.bytes,
+                "expired": self.expired, "evicted": self.evicted}
+
+
+class SqliteSessionStore:
+    """SQLite (WAL) table shared by every worker process on the host — no sticky routing needed.
+
+    A write can wait up to the 5s busy timeout while another worker holds the lock,
+    so async code goes through session_get / session_put, which run calls on the
+    store's single thread — off the event loop, and in the order they were made.
+    get() only rewrites the expiry once a tenth of the TTL has elapsed, keeping
+    reads from taking the write lock.
+    """
+
+    def __init__(self, path: str, ttl: int, max_sessions: int):
+        self.ttl, self.max_sessions, self.writes = ttl, max_sessions, 0
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(1, thread_name_prefix="sessions")
+        self.db   = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS sessions (sid TEXT PRIMARY KEY, data TEXT, expires REAL)")
+
+    def get(self, sid: str):
+        now = time.time()
+        with self.lock:
+            row = self.db.execute("SELECT data, expires FROM sessions WHERE sid=? AND expires>?", (sid, now)).fetchone()
+            if row and row[1] < now + self.ttl * 0.9:
+                self.db.execute("UPDATE sessions SET expires=? WHERE sid=?", (now + self.ttl, sid))
+        return json.loads(row[0]) if row else None
+
+    def put(self, sid: str, session: dict):
+        now = time.time()
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO sessions VALUES (?,?,?)",
+                            (sid, json.dumps(session, default=str), now + self.ttl))
+            self.writes += 1
+            if self.writes % 100 == 0:   # amortised expiry + cap
+                self.db.execute("DELETE FROM sessions WHERE expires<=? OR sid IN (SELECT sid FROM sessions "
+                                "ORDER BY expires DESC LIMIT -1 OFFSET ?)", (now, self.max_sessions))
+
+    def delete(self, sid: str):
+        with self.lock:
+            self.db.execute("DELETE FROM sessions WHERE sid=?", (sid,))
+
+    def stats(self) -> dict:
+        with self.lock:
+            n = self.db.execute("SELECT COUNT(*) FROM sessions WHERE expires>?", (time.time(),)).fetchone()[0]
+        return {"backend": "sqlite", "sessions": n}
+
+
+# Resume text is kept zlib-compressed in the session; decompressed copies are shared by hash
+resume_texts = LRUCache(256)
+
+
+def pack_text(text: str) -> str:
+    return base64.b64encode(zlib.compress(text.encode(), 6)).decode()
+
+
+def resume_text(session: dict) -> str:
+    if "resume_text" in session:          # stored before compression was introduced
+        return session["resume_text"]
+    key = session["resume_hash"]
+    return resume_texts.get(key) or resume_texts.put(key, zlib.decompress(base64.b64decode(session["resume_z"])).decode())
+
+
+sessions = (SqliteSessionStore(SESSION_DB_PATH, SESSION_TTL, SESSION_MAX) if SESSION_STORE == "sqlite" else
+            MemorySessionStore(SESSION_TTL, SESSION_MAX, SESSION_MAX_MB * 1024 * 1024))
+
+
+async def session_get(sid: str):
+    if isinstance(sessions, SqliteSessionStore):
+        return await asyncio.get_running_loop().run_in_executor(sessions.executor, sessions.get, sid)
+    return sessions.get(sid)
+
+
+async def session_put(sid: str, session: dict):
+    if isinstance(sessions, SqliteSessionStore):
+        return await asyncio.get_running_loop().run_in_executor(sessions.executor, sessions.put, sid, session)
+    sessions.put(sid, session)
+
+
+async def session_delete(sid: str):
+    if isinstance(sessions, SqliteSessionStore):
+        return await asyncio.get_running_loop().run_in_executor(sessions.executor, sessions.delete, sid)
+    sessions.delete(sid)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# UPSTREAM HTTP
+# ═══════════════════════════════════════════════════════════════════════════════
+class UpstreamUnavailable(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """Opens after `failures` consecutive errors; lets one trial request through after `cooldown`."""
+
+    def __init__(self, failures: int, cooldown: float):
+        self.threshold, self.cooldown = failures, cooldown
+        self.failures, self.opened_at, self.trial = 0, 0.0, False
+
+    @property
+    def state(self) -> str:
+        if self.failures < self.threshold: return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed": return True
+        if state == "half-open" and not self.trial:
+            self.trial = True
+            return True
+        return False
+
+    def abandon(self):
+        """The request ended without a verdict (cancelled, non-HTTP error): free the half-open trial slot."""
+        self.trial = False
+
+    def record(self, ok: bool):
+        self.trial = False
+        if ok:
+            self.failures = 0
+        else:
+            self.failures += 1
+            if self.failures >= self.threshold: self.opened_at = time.monotonic()
+
+
+class Upstream:
+    """Application-lifetime pooled client (keep-alive, HTTP/2 when h2 is installed) for one host."""
+
+    def __init__(self, name: str, base_url: str):
+        self.name, self.base_url, self.client = name, base_url, None
+        self.breaker = CircuitBreaker(BREAKER_FAILURES, BREAKER_COOLDOWN)
+        self.latency = deque(maxlen=200)
+        self.stats = Counter()
+
+    def start(self):
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                base_url=self.base_url, http2=HTTP2, timeout=UPSTREAM_TIMEOUT,
+                limits=httpx.Limits(max_connections=UPSTREAM_MAX_CONNS,
+                                    max_keepalive_connections=UPSTREAM_MAX_CONNS, keepalive_expiry=60))
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def get(self, path: str, **kwargs) -> httpx.Response:
+        if not self.breaker.allow():
+            self.stats["short_circuited"] += 1
+            raise UpstreamUnavailable(f"{self.name} circuit open")
+        self.start()
+        t0 = time.monotonic()
+        try:
+            r = await self.client.get(path, **kwargs)
+        except httpx.HTTPError:
+            self.stats["errors"] += 1
+            self.breaker.record(ok=False)
+            raise
+        except BaseException:
+            self.breaker.abandon()
+            raise
+        finally:
+            self.latency.append((time.monotonic() - t0) * 1000)
+        self.stats["requests"] += 1
+        self.stats[f"status_{r.status_code // 100}xx"] += 1
+        self.breaker.record(ok=r.status_code < 500 and r.status_code != 429)
+        return r
+
+    def metrics(self) -> dict:
+        ms = sorted(self.latency)
+        return {**self.stats, "breaker": self.breaker.state, "http2": HTTP2,
+                "p50_ms": round(ms[len(ms)//2], 1) if ms else 0.0,
+                "p95_ms": round(ms[min(len(ms)-1, int(len(ms)*0.95))], 1) if ms else 0.0}
+
+
+upstreams = {"adzuna": Upstream("adzuna", "https://api.adzuna.com")}
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# JOB SEARCH CACHE
+# ═══════════════════════════════════════════════════════════════════════════════
+def normalise_adzuna_job(j: dict) -> dict:
+    return {
+        "id":          str(j.get("id", "")),
+        "title":       j.get("title",""),
+        "company":     j.get("company", {}).get("display_name",""),
+        "location":    j.get("location", {}).get("display_name",""),
+        "salary":      f"£{j.get('salary_min',0):,.0f}–£{j.get('salary_max',0):,.0f}" if j.get("salary_min") else "Competitive",
+        "type":        "Full-time",
+        "logo":        "🏢",
+        "apply_url":   j.get("redirect_url","#"),
+        "posted":      "Recently",
+        "description": j.get("description",""),   # full text, truncated only when returned
+        "source":      "Adzuna",
+    }
+
+
+async def fetch_adzuna_page(role: str, location: str, page: int) -> list:
+    country = "in"   # India
+    r = await upstreams["adzuna"].get(f"/v1/api/jobs/{country}/search/{page}", params={
+        "app_id": ADZUNA_APP_ID, "app_key": ADZUNA_APP_KEY, "results_per_page": JOB_PAGE_SIZE,
+        "what": role, "where": location, "content-type": "application/json"})
+    if r.status_code != 200:
+        raise httpx.HTTPStatusError(f"Adzuna returned {r.status_code}", request=r.request, response=r)
+    return [normalise_adzuna_job(j) for j in r.json().get("results", [])]
+
+
+class JobCache:
+    """Stale-while-revalidate cache of listing pages with background prefetch of the next page."""
+
+    def __init__(self, max_entries: int, fresh: int, stale: int):
+        self.pages = LRUCache(max_entries)       # key → (fetched_at, JobIndex)
+        self.fresh, self.stale = fresh, stale
+        self.tasks: dict = {}                    # key → in-flight fetch task
+        self.stats = Counter()
+
+    @staticmethod
+    def key(role: str, location: str, page: int) -> tuple:
+        return (" ".join(role.lower().split()), " ".join(location.lower().split()), page)
+
+    def _fetch(self, role: str, location: str, page: int) -> asyncio.Task:
+        key = self.key(role, location, page)
+        if key not in self.tasks:
+            async def run():
+                try:
+                    index = JobIndex(await fetch_adzuna_page(role, location, page))
+                    self.pages.put(key, (time.time(), index))
+                    self.stats["fetched"] += 1
+                    return index
+                finally:
+                    self.tasks.pop(key, None)
+            self.tasks[key] = asyncio.get_running_loop().create_task(run())
+            self.tasks[key].add_done_callback(lambda t: t.cancelled() or t.exception())
+        return self.tasks[key]
+
+    def prefetch(self, role: str, location: str, page: int):
+        key = self.key(role, location, page)
+        entry = self.pages.data.get(key)
+        if entry is None or time.time() - entry[0][0] > self.fresh:
+            self.stats["prefetches"] += 1
+            self._fetch(role, location, page)
+
+    async def get(self, role: str, location: str, page: int = 1) -> "JobIndex":
+        entry = self.pages.get(self.key(role, location, page))
+        age   = time.time() - entry[0] if entry else None
+        if entry and age <= self.fresh:
+            self.stats["fresh_hits"] += 1
+        elif entry and age <= self.stale:
+            self.stats["stale_hits"] += 1
+            self._fetch(role, location, page)      # revalidate in the background
+        else:
+            self.stats["misses"] += 1
+            entry = (time.time(), await asyncio.shield(self._fetch(role, location, page)))
+        if JOB_PREFETCH and len(entry[1]):
+            self.prefetch(role, location, page + 1)
+        return entry[1]
+
+    def metrics(self) -> dict:
+        return {**self.stats, "pages": len(self.pages.data), "refreshing": len(self.tasks)}
+
+
+job_cache = JobCache(JOB_CACHE_SIZE, JOB_CACHE_FRESH, JOB_CACHE_STALE)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# TASK QUEUE
+# ═══════════════════════════════════════════════════════════════════════════════
+# Long generations run on a fixed pool of worker coroutines instead of holding the
+# HTTP request open. Task records live in this process only (under --workers N,
+# /tasks/{id} needs sticky routing); results the client needs later are also
+# written to the session by the runner.
+class TaskQueue:
+    """Bounded FIFO of coroutine factories with status/timing records, cancellation and waiters."""
+
+    def __init__(self, workers: int, max_queued: int, keep: int):
+        self.workers, self.keep = workers, keep
+        self.queue: asyncio.Queue = asyncio.Queue(max_queued)
+        self.tasks: OrderedDict = OrderedDict()   # id → record (public fields + private "_" fields)
+        self.pool: list = []
+        self.stats = Counter()
+
+    def start(self):
+        if not self.pool:
+            self.pool = [asyncio.get_running_loop().create_task(self._worker()) for _ in range(self.workers)]
+
+    async def close(self):
+        for w in self.pool: w.cancel()
+        await asyncio.gather(*self.pool, return_exceptions=True)
+        self.pool = []
+
+    def submit(self, kind: str, session_id: str, fn) -> dict:
+        rec = {"id": uuid.uuid4().hex, "kind": kind, "session_id": session_id, "status": "queued",
+               "submitted_at": time.time(), "started_at": None, "finished_at": None,
+               "queue_ms": None, "run_ms": None, "result": None, "error": None,
+               "_fn": fn, "_task": None, "_cancel": False, "_done": asyncio.Event()}
+        try:
+            self.queue.put_nowait(rec["id"])
+        except asyncio.QueueFull:
+            self.stats["rejected"] += 1
+            raise HTTPException(429, "Task queue is full — please retry shortly.", headers={"Retry-After": "5"})
+        self.tasks[rec["id"]] = rec
+        self.stats["submitted"] += 1
+        self._prune()
+        return rec
+
+    def get(self, task_id: str) -> dict | None:
+        return self.tasks.get(task_id)
+
+    def cancel(self, task_id: str) -> dict | None:
+        rec = self.tasks.get(task_id)
+        if rec is None or rec["_done"].is_set(): return rec
+        if rec["_task"] is not None:
+            rec["_cancel"] = True
+            rec["_task"].cancel()            # running: the worker records the cancellation
+        else:
+            self._finish(rec, "cancelled")   # still queued: the worker skips it
+        return rec
+
+    async def wait(self, rec: dict, timeout: float):
+        try:
+            await asyncio.wait_for(rec["_done"].wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    @staticmethod
+    def public(rec: dict) -> dict:
+        return {k: v for k, v in rec.items() if not k.startswith("_")}
+
+    def _finish(self, rec: dict, status: str, result=None, error: str | None = None):
+        now = time.time()
+        rec.update(status=status, finished_at=now, result=result, error=error, _fn=None, _task=None)
+        if rec["started_at"] is not None:
+            rec["run_ms"] = round(1000 * (now - rec["started_at"]), 1)
+        rec["_done"].set()
+        self.stats[status] += 1
+
+    def _prune(self):
+        finished = [tid for tid, r in self.tasks.items() if r["_done"].is_set()]
+        for tid in finished[:max(0, len(self.tasks) - self.keep)]:
+            del self.tasks[tid]
+
+    async def _worker(self):
+        while True:
+            rec = self.tasks.get(await self.queue.get())
+            if rec is None or rec["_done"].is_set():
+                continue
+            rec["status"], rec["started_at"] = "running", time.time()
+            rec["queue_ms"] = round(1000 * (rec["started_at"] - rec["submitted_at"]), 1)
+            rec["_task"] = asyncio.get_running_loop().create_task(rec["_fn"](rec))
+            try:
+                self._finish(rec, "done", result=await rec["_task"])
+            except asyncio.CancelledError:
+                # shutdown cancels the awaited task too, so only the flag tells a user cancel apart
+                cancelled_by_user = rec["_cancel"]
+                self._finish(rec, "cancelled")
+                if not cancelled_by_user: raise     # the worker itself is shutting down
+            except HTTPException as e:
+                self._finish(rec, "failed", error=e.detail)
+            except Exception as e:
+                log.exception("task %s (%s) failed", rec["id"], rec["kind"])
+                self._finish(rec, "failed", error=str(e) or type(e).__name__)
+
+    def metrics(self) -> dict:
+        running = sum(r["status"] == "running" for r in self.tasks.values())
+        return {**self.stats, "queued": self.queue.qsize(), "running": running, "workers": len(self.pool)}
+
+
+task_queue = TaskQueue(TASK_WORKERS, TASK_QUEUE_LIMIT, TASK_KEEP)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# PRE-GENERATION
+# ═══════════════════════════════════════════════════════════════════════════════
+# After an opted-in /analyze, the generators users nearly always click next are
+# started on the lowest scheduler lane. Results are kept by the Pregenerator, per
+# session id and outside the session itself (so a route writing back an older copy
+# of the session can't erase them), with a hash of the exact prompt; a later request
+# whose prompt hashes the same is served from there (or joins the call still in
+# flight). Anything else — a new role, a different num_questions — simply misses.
+# Like task records, results live in the worker process that ran /analyze.
+PREGEN_ENDPOINTS = ("generate-questions", "generate-projects", "generate-schedule")
+
+
+def prompt_key(prompt: dict) -> str:
+    return text_hash(json.dumps(prompt, sort_keys=True))
+
+
+class Pregenerator:
+    def __init__(self):
+        self.tasks: dict = {}                     # sid → {endpoint: (prompt key, task)}
+        self.results: OrderedDict = OrderedDict()   # sid → {endpoint: {"key", "raw", "tokens"}}, oldest first
+        self.stats = Counter()
+
+    def start(self, sid: str, session: dict):
+        for endpoint in PREGEN_ENDPOINTS:
+            model_cls, prompt_fn, _ = STREAMERS[endpoint]
+            prompt = prompt_fn(session, model_cls(session_id=sid))
+            key    = prompt_key(prompt)
+            if self.results.get(sid, {}).get(endpoint, {}).get("key") == key: continue
+            if (running := self.tasks.get(sid, {}).get(endpoint)) and running[0] == key: continue
+            if should_shed(endpoint, prompt.get("smart", False)): continue   # don't add to an overloaded queue
+            self.stats["started"] += 1
+            task = asyncio.get_running_loop().create_task(self._run(sid, endpoint, key, prompt))
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self.tasks.setdefault(sid, {})[endpoint] = (key, task)
+
+    def invalidate(self, sid: str):
+        """Drop stored results and cancel running warm-ups (the role or gap analysis changed)."""
+        for entry in self.results.pop(sid, {}).values():
+            self.stats["discarded"] += 1
+            self.stats["wasted_tokens"] += entry["tokens"]
+        for _, task in self.tasks.pop(sid, {}).values():
+            task.cancel()
+
+    async def _run(self, sid: str, endpoint: str, key: str, prompt: dict) -> str:
+        spend = Counter()
+        llm_spend.set(spend)
+        try:
+            model = router.choose(prompt.get("smart", False), endpoint,
+                                  estimate_tokens(prompt["system"]) + estimate_tokens(prompt["user"]), prompt["max_tokens"])
+            text, _ = await _complete(model, prompt["system"], prompt["user"], prompt["temperature"],
+                                      prompt["max_tokens"], endpoint, PREGENERATE_PRIORITY)
+        except asyncio.CancelledError:
+            self.stats["cancelled"] += 1
+            self.stats["wasted_tokens"] += spend["tokens"] or estimate_tokens(prompt["system"] + prompt["user"])
+            raise
+        except Exception:
+            self.stats["failed"] += 1
+            raise
+        finally:
+            if self.tasks.get(sid, {}).get(endpoint, (None,))[0] == key:
+                del self.tasks[sid][endpoint]
+                if not self.tasks[sid]: del self.tasks[sid]
+        self.results.setdefault(sid, {})[endpoint] = {"key": key, "raw": text, "tokens": spend["tokens"]}
+        self.results.move_to_end(sid)
+        while len(self.results) > SESSION_MAX:
+            for entry in self.results.popitem(last=False)[1].values():
+                self.stats["wasted_tokens"] += entry["tokens"]
+        self.stats["ready"] += 1
+        return text
+
+    def _pop(self, sid: str, endpoint: str) -> dict | None:
+        stored = self.results.get(sid, {}).pop(endpoint, None)
+        if sid in self.results and not self.results[sid]: del self.results[sid]
+        return stored
+
+    async def take(self, sid: str, endpoint: str, prompt: dict) -> str | None:
+        """The pre-generated output for this exact prompt, waiting for it if still running; else None."""
+        key    = prompt_key(prompt)
+        stored = self._pop(sid, endpoint)
+        if stored and stored["key"] == key:
+            self.stats["hits"] += 1
+            self.stats["used_tokens"] += stored["tokens"]
+            trace_llm(endpoint, "pregenerated")
+            return stored["raw"]
+        if stored:
+            self.stats["wasted_tokens"] += stored["tokens"]
+        running = self.tasks.get(sid, {}).get(endpoint)
+        if running and running[0] == key:
+            try:
+                text = await asyncio.shield(running[1])
             except Exception:
-                pass
-    return {}
+                text = None
+            else:
+                self.stats["joined"] += 1
+                trace_llm(endpoint, "pregenerated")
+            stored = self._pop(sid, endpoint)   # written by _run while we waited
+            if stored: self.stats["used_tokens"] += stored["tokens"]
+            return text
+        if stored or running:
+            self.stats["misses"] += 1
+        return None
+
+    def metrics(self) -> dict:
+        served = self.stats["hits"] + self.stats["joined"]
+        return {**self.stats, "running": sum(len(t) for t in self.tasks.values()),
+                "stored": sum(len(r) for r in self.results.values()),
+                "hit_rate": round(served / (served + self.stats["misses"]), 3) if served + self.stats["misses"] else None}
+
+
+pregen = Pregenerator()
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# LOAD SHEDDING
+# ═══════════════════════════════════════════════════════════════════════════════
+# When every model an endpoint could be routed to is backed up (scheduler queue
+# depth or recent p95 over threshold), generators are answered by the rule
+# engine instead of joining the queue. SHED_MODE=always forces it, off disables it.
+RULE_ENGINE = {
+    "generate-questions": lambda s, req: rule_questions(s.get("profile", {}), s.get("gap", {}),
+                                                        s.get("target_role", "Software Engineer"), req.num_questions),
+    "generate-projects":  lambda s, req: rule_projects(s.get("profile", {}), s.get("gap", {}), s.get("target_role", "Developer")),
+    "generate-schedule":  lambda s, req: rule_schedule(s.get("gap", {}), s.get("target_role", "Developer")),
+}
+shed_stats = Counter()
+
+
+def overloaded(model: str) -> bool:
+    queued = schedulers[model].metrics()["queued"] if model in schedulers else 0
+    return queued >= SHED_QUEUE_DEPTH or router.p95(model) >= SHED_P95_MS
+
+
+def should_shed(endpoint: str, smart: bool) -> bool:
+    if endpoint not in RULE_ENGINE or SHED_MODE == "off": return False
+    if SHED_MODE == "always": return True
+    return all(overloaded(m) for m in {MODEL_NAME, MODEL_SMART if smart else MODEL_NAME})
+
+
+def rule_output(endpoint: str, session: dict, req, prompt: dict) -> str | None:
+    """Rule-engine JSON for endpoint when load shedding applies, else None."""
+    if not should_shed(endpoint, prompt.get("smart", False)): return None
+    shed_stats[endpoint] += 1
+    trace_llm(endpoint, "rules")
+    return json.dumps(RULE_ENGINE[endpoint](session, req))
+
+
+def shedding_metrics() -> dict:
+    return {"mode": SHED_MODE, "shed": dict(shed_stats),
+            "overloaded": {m: overloaded(m) for m in dict.fromkeys([MODEL_NAME, MODEL_SMART])}}
+
+
+async def generate(endpoint: str, session: dict, req) -> str:
+    """LLM output for a generator endpoint: pre-generated if it matches, rule-based under overload, else ask_llm."""
+    prompt = STREAMERS[endpoint][1](session, req)
+    return (await pregen.take(req.session_id, endpoint, prompt)
+            or rule_output(endpoint, session, req, prompt) or await ask_llm(**prompt))
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# PDF EXTRACTION POOL
+# ═══════════════════════════════════════════════════════════════════════════════
+_pdf_pool: ProcessPoolExecutor | None = None
+pdf_stats = {"workers": PDF_WORKERS, "limit": PDF_QUEUE_LIMIT, "inflight": 0,
+             "completed": 0, "rejected": 0, "timeouts": 0, "failed": 0,
+             "bytes_in": 0, "pages_read": 0, "truncated": 0}
+pdf_slot_freed = asyncio.Event()   # set whenever an in-flight extraction finishes
+
+
+def iter_pdf_pages(path: str, max_pages: int, deadline: float):
+    """Yield page text lazily so callers can stop as soon as they have enough."""
+    with pdfplumber.open(path) as pdf:
+        for page in pdf.pages[:max_pages]:
+            if time.monotonic() > deadline: return
+            yield page.extract_text() or ""
+            page.flush_cache()
+
+
+def _extract_pdf_text(path: str, max_pages: int, max_chars: int, time_limit: float) -> dict:
+    """Runs in a worker process. Stops at max_pages, max_chars or once time_limit is spent.
+
+    time_limit is only checked between pages; a single pathological page runs to completion.
+    """
+    parts, pages, chars, truncated = [], 0, 0, False
+    for t in iter_pdf_pages(path, max_pages, time.monotonic() + time_limit):
+        pages += 1
+        if t:
+            parts.append(t); chars += len(t) + 1
+        if chars >= max_chars:
+            truncated = True; break
+    return {"text": "\n".join(parts)[:max_chars], "pages": pages, "truncated": truncated}
+
+
+def get_pdf_pool() -> ProcessPoolExecutor:
+    global _pdf_pool
+    if _pdf_pool is None:
+        _pdf_pool = ProcessPoolExecutor(max_workers=PDF_WORKERS)
+    return _pdf_pool
+
+
+def _release_pdf_slot():
+    pdf_stats["inflight"] -= 1
+    pdf_slot_freed.set()
+
+
+async def extract_pdf(path: str, wait: bool = False) -> dict:
+    """Extract text in the process pool; 422 on timeout or unreadable PDF.
+
+    When saturated, answers 429 — or, with wait (batch items), waits for a free slot.
+    A slot stays taken until the pool finishes the file, even after a timeout: the
+    worker only checks its time limit between pages, so it may still be running.
+    """
+    while pdf_stats["inflight"] >= PDF_QUEUE_LIMIT:
+        if not wait:
+            pdf_stats["rejected"] += 1
+            raise HTTPException(429, "Resume parser is busy — please retry shortly.", headers={"Retry-After": "2"})
+        pdf_slot_freed.clear()
+        await pdf_slot_freed.wait()
+    loop = asyncio.get_running_loop()
+    pdf_stats["inflight"] += 1
+    try:
+        job = get_pdf_pool().submit(_extract_pdf_text, path, PDF_MAX_PAGES, RESUME_MAX_CHARS, PDF_TIMEOUT)
+    except BaseException:
+        _release_pdf_slot(); raise
+    job.add_done_callback(lambda _: loop.is_closed() or loop.call_soon_threadsafe(_release_pdf_slot))
+    try:
+        # the worker stops itself at PDF_TIMEOUT; the grace covers queueing behind other files.
+        # A timeout cancels the job if it hasn't started; a running one keeps its slot until it ends.
+        result = await asyncio.wait_for(asyncio.wrap_future(job), PDF_TIMEOUT * 2)
+    except asyncio.TimeoutError:
+        pdf_stats["timeouts"] += 1
+        raise HTTPException(422, "PDF extraction timed out.")
+    except HTTPException:
+        raise
+    except Exception:
+        pdf_stats["failed"] += 1
+        raise HTTPException(422, "Could not read PDF.")
+    pdf_stats["completed"] += 1
+    pdf_stats["pages_read"] += result["pages"]
+    pdf_stats["truncated"]  += result["truncated"]
+    return result
+
+
+async def spool_upload(file: UploadFile, max_bytes: int = PDF_MAX_BYTES, kind: str = "PDF") -> tuple[str, int, str]:
+    """Copy the upload to a temp file in chunks; returns (path, bytes, sha256). Caller removes the file."""
+    tmp, size, digest = tempfile.NamedTemporaryFile(suffix="." + kind.lower(), delete=False), 0, hashlib.sha256()
+    try:
+        with tmp:
+            while chunk := await file.read(UPLOAD_CHUNK):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(413, f"{kind} larger than {max_bytes // (1024*1024)} MB.")
+                digest.update(chunk)
+                tmp.write(chunk)
+    except BaseException:
+        os.unlink(tmp.name); raise
+    pdf_stats["bytes_in"] += size
+    return tmp.name, size, digest.hexdigest()
+
+
+def pdf_pool_metrics() -> dict:
+    return {**pdf_stats, "queue_depth": max(0, pdf_stats["inflight"] - PDF_WORKERS)}
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -216,61 +1740,118 @@ DEFAULT_ROLE_REQ = {
 # ── Job board mock data (used when Adzuna keys not set) ───────────────────────
 MOCK_JOBS = {
     "Full Stack Developer": [
-        {"title":"Senior Full Stack Developer","company":"Razorpay","location":"Bangalore, India","salary":"₹18–35 LPA","type":"Full-time","logo":"🟣","apply_url":"https://www.linkedin.com/jobs/search/?keywords=full+stack+developer&location=Bangalore","posted":"2 days ago","match":94},
-        {"title":"Full Stack Engineer (React + Node)","company":"Swiggy","location":"Bangalore, India","salary":"₹20–40 LPA","type":"Full-time","logo":"🟠","apply_url":"https://careers.swiggy.com","posted":"1 day ago","match":91},
-        {"title":"Full Stack Developer","company":"Freshworks","location":"Chennai, India","salary":"₹15–28 LPA","type":"Full-time","logo":"🟢","apply_url":"https://www.freshworks.com/company/careers/","posted":"3 days ago","match":88},
-        {"title":"Software Engineer – Full Stack","company":"Atlassian","location":"Remote","salary":"$100–140K USD","type":"Remote","logo":"🔵","apply_url":"https://www.atlassian.com/company/careers","posted":"Today","match":85},
-        {"title":"Full Stack Intern","company":"Zepto","location":"Mumbai, India","salary":"₹40–60K/month","type":"Internship","logo":"🟡","apply_url":"https://www.linkedin.com/jobs/search/?keywords=full+stack+intern","posted":"4 days ago","match":79},
+        {"title":"Senior Full Stack Developer","company":"Razorpay","location":"Bangalore, India","salary":"₹18–35 LPA","type":"Full-time","logo":"🟣","apply_url":"https://www.linkedin.com/jobs/search/?keywords=full+stack+developer&location=Bangalore","posted":"2 days ago","keywords":"React, Node, TypeScript, PostgreSQL, Redis, AWS, Docker, Microservices","match":94},
+        {"title":"Full Stack Engineer (React + Node)","company":"Swiggy","location":"Bangalore, India","salary":"₹20–40 LPA","type":"Full-time","logo":"🟠","apply_url":"https://careers.swiggy.com","posted":"1 day ago","keywords":"React, Node, JavaScript, MongoDB, Redis, GraphQL, Git","match":91},
+        {"title":"Full Stack Developer","company":"Freshworks","location":"Chennai, India","salary":"₹15–28 LPA","type":"Full-time","logo":"🟢","apply_url":"https://www.freshworks.com/company/careers/","posted":"3 days ago","keywords":"JavaScript, React, Ruby, MySQL, REST, HTML, CSS, Git","match":88},
+        {"title":"Software Engineer – Full Stack","company":"Atlassian","location":"Remote","salary":"$100–140K USD","type":"Remote","logo":"🔵","apply_url":"https://www.atlassian.com/company/careers","posted":"Today","keywords":"Java, Spring, TypeScript, React, PostgreSQL, AWS, Microservices, CI/CD","match":85},
+        {"title":"Full Stack Intern","company":"Zepto","location":"Mumbai, India","salary":"₹40–60K/month","type":"Internship","logo":"🟡","apply_url":"https://www.linkedin.com/jobs/search/?keywords=full+stack+intern","posted":"4 days ago","keywords":"JavaScript, React, Node, HTML, CSS, SQL, Git","match":79},
     ],
     "Data Scientist": [
-        {"title":"Data Scientist II","company":"Amazon","location":"Hyderabad, India","salary":"₹25–45 LPA","type":"Full-time","logo":"🟠","apply_url":"https://www.amazon.jobs/en/search?base_query=data+scientist","posted":"1 day ago","match":95},
-        {"title":"Senior Data Scientist","company":"Flipkart","location":"Bangalore, India","salary":"₹20–38 LPA","type":"Full-time","logo":"🟡","apply_url":"https://www.flipkartcareers.com","posted":"2 days ago","match":90},
-        {"title":"Data Scientist – Fraud Analytics","company":"PhonePe","location":"Bangalore, India","salary":"₹18–32 LPA","type":"Full-time","logo":"🟣","apply_url":"https://careers.phonepe.com","posted":"3 days ago","match":87},
-        {"title":"Machine Learning Scientist","company":"Fractal Analytics","location":"Mumbai, India","salary":"₹12–22 LPA","type":"Full-time","logo":"🔷","apply_url":"https://fractal.ai/careers","posted":"Today","match":83},
-        {"title":"Data Scientist Intern","company":"CRED","location":"Bangalore, India","salary":"₹50–80K/month","type":"Internship","logo":"⚫","apply_url":"https://www.linkedin.com/jobs/search/?keywords=data+scientist+intern+bangalore","posted":"5 days ago","match":78},
+        {"title":"Data Scientist II","company":"Amazon","location":"Hyderabad, India","salary":"₹25–45 LPA","type":"Full-time","logo":"🟠","apply_url":"https://www.amazon.jobs/en/search?base_query=data+scientist","posted":"1 day ago","keywords":"Python, SQL, Machine Learning, pandas, scikit-learn, AWS, Spark","match":95},
+        {"title":"Senior Data Scientist","company":"Flipkart","location":"Bangalore, India","salary":"₹20–38 LPA","type":"Full-time","logo":"🟡","apply_url":"https://www.flipkartcareers.com","posted":"2 days ago","keywords":"Python, Machine Learning, Deep Learning, PyTorch, SQL, pandas, numpy","match":90},
+        {"title":"Data Scientist – Fraud Analytics","company":"PhonePe","location":"Bangalore, India","salary":"₹18–32 LPA","type":"Full-time","logo":"🟣","apply_url":"https://careers.phonepe.com","posted":"3 days ago","keywords":"Python, SQL, scikit-learn, pandas, Machine Learning, Data Science","match":87},
+        {"title":"Machine Learning Scientist","company":"Fractal Analytics","location":"Mumbai, India","salary":"₹12–22 LPA","type":"Full-time","logo":"🔷","apply_url":"https://fractal.ai/careers","posted":"Today","keywords":"Python, TensorFlow, PyTorch, Deep Learning, NLP, Computer Vision","match":83},
+        {"title":"Data Scientist Intern","company":"CRED","location":"Bangalore, India","salary":"₹50–80K/month","type":"Internship","logo":"⚫","apply_url":"https://www.linkedin.com/jobs/search/?keywords=data+scientist+intern+bangalore","posted":"5 days ago","keywords":"Python, pandas, numpy, SQL, scikit-learn","match":78},
     ],
     "ML Engineer": [
-        {"title":"ML Engineer – NLP","company":"Google","location":"Hyderabad, India","salary":"₹30–55 LPA","type":"Full-time","logo":"🔵","apply_url":"https://careers.google.com/jobs/results/?q=machine+learning+engineer","posted":"Today","match":96},
-        {"title":"Senior MLOps Engineer","company":"Microsoft","location":"Bangalore, India","salary":"₹28–50 LPA","type":"Full-time","logo":"🔵","apply_url":"https://careers.microsoft.com/us/en/search-results?keywords=ml+engineer","posted":"2 days ago","match":92},
-        {"title":"ML Infrastructure Engineer","company":"ShareChat","location":"Bangalore, India","salary":"₹22–40 LPA","type":"Full-time","logo":"🟣","apply_url":"https://sharechat.com/careers","posted":"1 day ago","match":89},
-        {"title":"Research Engineer – ML","company":"Sarvam AI","location":"Bangalore, India","salary":"₹20–45 LPA","type":"Full-time","logo":"🤖","apply_url":"https://www.sarvam.ai/careers","posted":"3 days ago","match":85},
-        {"title":"ML Engineer (Computer Vision)","company":"Ola","location":"Bangalore, India","salary":"₹18–35 LPA","type":"Full-time","logo":"🟡","apply_url":"https://www.linkedin.com/jobs/search/?keywords=ml+engineer+computer+vision+bangalore","posted":"4 days ago","match":80},
+        {"title":"ML Engineer – NLP","company":"Google","location":"Hyderabad, India","salary":"₹30–55 LPA","type":"Full-time","logo":"🔵","apply_url":"https://careers.google.com/jobs/results/?q=machine+learning+engineer","posted":"Today","keywords":"Python, NLP, TensorFlow, Deep Learning, Machine Learning, GCP","match":96},
+        {"title":"Senior MLOps Engineer","company":"Microsoft","location":"Bangalore, India","salary":"₹28–50 LPA","type":"Full-time","logo":"🔵","apply_url":"https://careers.microsoft.com/us/en/search-results?keywords=ml+engineer","posted":"2 days ago","keywords":"Python, Docker, Kubernetes, Azure, CI/CD, Machine Learning","match":92},
+        {"title":"ML Infrastructure Engineer","company":"ShareChat","location":"Bangalore, India","salary":"₹22–40 LPA","type":"Full-time","logo":"🟣","apply_url":"https://sharechat.com/careers","posted":"1 day ago","keywords":"Python, Go, Kubernetes, Docker, GCP, Redis, Machine Learning","match":89},
+        {"title":"Research Engineer – ML","company":"Sarvam AI","location":"Bangalore, India","salary":"₹20–45 LPA","type":"Full-time","logo":"🤖","apply_url":"https://www.sarvam.ai/careers","posted":"3 days ago","keywords":"Python, PyTorch, Deep Learning, NLP, Machine Learning","match":85},
+        {"title":"ML Engineer (Computer Vision)","company":"Ola","location":"Bangalore, India","salary":"₹18–35 LPA","type":"Full-time","logo":"🟡","apply_url":"https://www.linkedin.com/jobs/search/?keywords=ml+engineer+computer+vision+bangalore","posted":"4 days ago","keywords":"Python, Computer Vision, OpenCV, PyTorch, Deep Learning, C++","match":80},
     ],
     "DevOps / Cloud Engineer": [
-        {"title":"Senior DevOps Engineer","company":"Infosys","location":"Bangalore, India","salary":"₹12–22 LPA","type":"Full-time","logo":"🔷","apply_url":"https://www.infosys.com/careers/apply.html","posted":"1 day ago","match":88},
-        {"title":"Cloud Infrastructure Engineer","company":"Walmart Labs","location":"Bangalore, India","salary":"₹20–38 LPA","type":"Full-time","logo":"🔵","apply_url":"https://careers.walmart.com/results?q=devops","posted":"Today","match":91},
-        {"title":"SRE / DevOps Engineer","company":"Razorpay","location":"Bangalore, India","salary":"₹18–32 LPA","type":"Full-time","logo":"🟣","apply_url":"https://razorpay.com/jobs","posted":"2 days ago","match":89},
-        {"title":"AWS Cloud Engineer","company":"TCS","location":"Mumbai, India","salary":"₹8–16 LPA","type":"Full-time","logo":"🔵","apply_url":"https://www.tcs.com/careers","posted":"3 days ago","match":82},
-        {"title":"DevOps Intern","company":"Freshworks","location":"Chennai, India","salary":"₹30–50K/month","type":"Internship","logo":"🟢","apply_url":"https://www.linkedin.com/jobs/search/?keywords=devops+intern+india","posted":"4 days ago","match":76},
+        {"title":"Senior DevOps Engineer","company":"Infosys","location":"Bangalore, India","salary":"₹12–22 LPA","type":"Full-time","logo":"🔷","apply_url":"https://www.infosys.com/careers/apply.html","posted":"1 day ago","keywords":"Docker, Kubernetes, Jenkins, Ansible, Linux, Bash, AWS, CI/CD","match":88},
+        {"title":"Cloud Infrastructure Engineer","company":"Walmart Labs","location":"Bangalore, India","salary":"₹20–38 LPA","type":"Full-time","logo":"🔵","apply_url":"https://careers.walmart.com/results?q=devops","posted":"Today","keywords":"Kubernetes, Terraform, Azure, GCP, Linux, Go, Networking","match":91},
+        {"title":"SRE / DevOps Engineer","company":"Razorpay","location":"Bangalore, India","salary":"₹18–32 LPA","type":"Full-time","logo":"🟣","apply_url":"https://razorpay.com/jobs","posted":"2 days ago","keywords":"Kubernetes, Docker, AWS, Terraform, Linux, Python, Go, Nginx","match":89},
+        {"title":"AWS Cloud Engineer","company":"TCS","location":"Mumbai, India","salary":"₹8–16 LPA","type":"Full-time","logo":"🔵","apply_url":"https://www.tcs.com/careers","posted":"3 days ago","keywords":"AWS, Terraform, Linux, Bash, Python, Networking","match":82},
+        {"title":"DevOps Intern","company":"Freshworks","location":"Chennai, India","salary":"₹30–50K/month","type":"Internship","logo":"🟢","apply_url":"https://www.linkedin.com/jobs/search/?keywords=devops+intern+india","posted":"4 days ago","keywords":"Linux, Bash, Git, Docker, Jenkins, CI/CD","match":76},
     ],
     "Product Manager": [
-        {"title":"Product Manager – Growth","company":"CRED","location":"Bangalore, India","salary":"₹20–38 LPA","type":"Full-time","logo":"⚫","apply_url":"https://www.linkedin.com/jobs/search/?keywords=product+manager+cred","posted":"Today","match":93},
-        {"title":"Senior Product Manager","company":"Swiggy","location":"Bangalore, India","salary":"₹25–45 LPA","type":"Full-time","logo":"🟠","apply_url":"https://careers.swiggy.com","posted":"2 days ago","match":90},
-        {"title":"Associate PM","company":"Razorpay","location":"Bangalore, India","salary":"₹18–30 LPA","type":"Full-time","logo":"🟣","apply_url":"https://razorpay.com/jobs","posted":"1 day ago","match":87},
-        {"title":"Product Manager – Payments","company":"PhonePe","location":"Bangalore, India","salary":"₹22–40 LPA","type":"Full-time","logo":"🟣","apply_url":"https://careers.phonepe.com","posted":"3 days ago","match":84},
-        {"title":"APM / PM Intern","company":"Meesho","location":"Bangalore, India","salary":"₹60–80K/month","type":"Internship","logo":"🟡","apply_url":"https://www.linkedin.com/jobs/search/?keywords=product+manager+intern+bangalore","posted":"5 days ago","match":78},
+        {"title":"Product Manager – Growth","company":"CRED","location":"Bangalore, India","salary":"₹20–38 LPA","type":"Full-time","logo":"⚫","apply_url":"https://www.linkedin.com/jobs/search/?keywords=product+manager+cred","posted":"Today","keywords":"SQL, Agile, Figma, Data Science","match":93},
+        {"title":"Senior Product Manager","company":"Swiggy","location":"Bangalore, India","salary":"₹25–45 LPA","type":"Full-time","logo":"🟠","apply_url":"https://careers.swiggy.com","posted":"2 days ago","keywords":"Agile, Scrum, SQL, Figma","match":90},
+        {"title":"Associate PM","company":"Razorpay","location":"Bangalore, India","salary":"₹18–30 LPA","type":"Full-time","logo":"🟣","apply_url":"https://razorpay.com/jobs","posted":"1 day ago","keywords":"SQL, Agile, Figma, REST","match":87},
+        {"title":"Product Manager – Payments","company":"PhonePe","location":"Bangalore, India","salary":"₹22–40 LPA","type":"Full-time","logo":"🟣","apply_url":"https://careers.phonepe.com","posted":"3 days ago","keywords":"SQL, Agile, Scrum, REST, Microservices","match":84},
+        {"title":"APM / PM Intern","company":"Meesho","location":"Bangalore, India","salary":"₹60–80K/month","type":"Internship","logo":"🟡","apply_url":"https://www.linkedin.com/jobs/search/?keywords=product+manager+intern+bangalore","posted":"5 days ago","keywords":"SQL, Figma, Agile","match":78},
     ],
     "Cybersecurity Analyst": [
-        {"title":"Security Analyst L2","company":"IBM","location":"Bangalore, India","salary":"₹8–16 LPA","type":"Full-time","logo":"🔵","apply_url":"https://www.ibm.com/employment/","posted":"2 days ago","match":88},
-        {"title":"Cybersecurity Engineer","company":"TCS","location":"Mumbai, India","salary":"₹7–14 LPA","type":"Full-time","logo":"🔵","apply_url":"https://www.tcs.com/careers","posted":"1 day ago","match":84},
-        {"title":"Penetration Tester","company":"HackerOne","location":"Remote","salary":"$70–110K USD","type":"Remote","logo":"🔴","apply_url":"https://www.hackerone.com/careers","posted":"Today","match":91},
-        {"title":"SOC Analyst","company":"Wipro","location":"Hyderabad, India","salary":"₹6–12 LPA","type":"Full-time","logo":"🟡","apply_url":"https://careers.wipro.com","posted":"3 days ago","match":80},
-        {"title":"Security Intern","company":"Razorpay","location":"Bangalore, India","salary":"₹35–55K/month","type":"Internship","logo":"🟣","apply_url":"https://www.linkedin.com/jobs/search/?keywords=security+intern+bangalore","posted":"4 days ago","match":75},
+        {"title":"Security Analyst L2","company":"IBM","location":"Bangalore, India","salary":"₹8–16 LPA","type":"Full-time","logo":"🔵","apply_url":"https://www.ibm.com/employment/","posted":"2 days ago","keywords":"Cybersecurity, Networking, Linux, Python","match":88},
+        {"title":"Cybersecurity Engineer","company":"TCS","location":"Mumbai, India","salary":"₹7–14 LPA","type":"Full-time","logo":"🔵","apply_url":"https://www.tcs.com/careers","posted":"1 day ago","keywords":"Cybersecurity, Networking, Cryptography, Linux, AWS","match":84},
+        {"title":"Penetration Tester","company":"HackerOne","location":"Remote","salary":"$70–110K USD","type":"Remote","logo":"🔴","apply_url":"https://www.hackerone.com/careers","posted":"Today","keywords":"Penetration Testing, Python, Linux, Networking, Bash","match":91},
+        {"title":"SOC Analyst","company":"Wipro","location":"Hyderabad, India","salary":"₹6–12 LPA","type":"Full-time","logo":"🟡","apply_url":"https://careers.wipro.com","posted":"3 days ago","keywords":"Cybersecurity, Networking, Linux","match":80},
+        {"title":"Security Intern","company":"Razorpay","location":"Bangalore, India","salary":"₹35–55K/month","type":"Internship","logo":"🟣","apply_url":"https://www.linkedin.com/jobs/search/?keywords=security+intern+bangalore","posted":"4 days ago","keywords":"Cybersecurity, Python, Linux, Cryptography","match":75},
     ],
 }
 
 DEFAULT_JOBS = [
-    {"title":"Software Engineer","company":"Google","location":"Hyderabad, India","salary":"₹20–45 LPA","type":"Full-time","logo":"🔵","apply_url":"https://careers.google.com","posted":"Today","match":88},
-    {"title":"Software Developer","company":"Microsoft","location":"Bangalore, India","salary":"₹22–48 LPA","type":"Full-time","logo":"🔵","apply_url":"https://careers.microsoft.com","posted":"2 days ago","match":85},
-    {"title":"Full Stack Engineer","company":"Razorpay","location":"Bangalore, India","salary":"₹18–35 LPA","type":"Full-time","logo":"🟣","apply_url":"https://razorpay.com/jobs","posted":"1 day ago","match":82},
-    {"title":"Backend Engineer","company":"Swiggy","location":"Bangalore, India","salary":"₹15–30 LPA","type":"Full-time","logo":"🟠","apply_url":"https://careers.swiggy.com","posted":"3 days ago","match":79},
-    {"title":"Software Engineer Intern","company":"Freshworks","location":"Chennai, India","salary":"₹40–60K/month","type":"Internship","logo":"🟢","apply_url":"https://www.freshworks.com/company/careers/","posted":"4 days ago","match":75},
+    {"title":"Software Engineer","company":"Google","location":"Hyderabad, India","salary":"₹20–45 LPA","type":"Full-time","logo":"🔵","apply_url":"https://careers.google.com","posted":"Today","keywords":"Python, Java, C++, Go, Linux, Git","match":88},
+    {"title":"Software Developer","company":"Microsoft","location":"Bangalore, India","salary":"₹22–48 LPA","type":"Full-time","logo":"🔵","apply_url":"https://careers.microsoft.com","posted":"2 days ago","keywords":"C#, Java, Python, Azure, SQL, Git","match":85},
+    {"title":"Full Stack Engineer","company":"Razorpay","location":"Bangalore, India","salary":"₹18–35 LPA","type":"Full-time","logo":"🟣","apply_url":"https://razorpay.com/jobs","posted":"1 day ago","keywords":"React, Node, JavaScript, PostgreSQL, REST, Git","match":82},
+    {"title":"Backend Engineer","company":"Swiggy","location":"Bangalore, India","salary":"₹15–30 LPA","type":"Full-time","logo":"🟠","apply_url":"https://careers.swiggy.com","posted":"3 days ago","keywords":"Java, Go, Redis, MySQL, Microservices, Docker","match":79},
+    {"title":"Software Engineer Intern","company":"Freshworks","location":"Chennai, India","salary":"₹40–60K/month","type":"Internship","logo":"🟢","apply_url":"https://www.freshworks.com/company/careers/","posted":"4 days ago","keywords":"Python, Java, SQL, Git","match":75},
 ]
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # RESUME PARSER
 # ═══════════════════════════════════════════════════════════════════════════════
+ALL_TECH = [
+    "Python","JavaScript","TypeScript","React","Node","Angular","Vue","Java","C","C++","C#",
+    "Go","Rust","Swift","Kotlin","PHP","Ruby","Scala","R","MATLAB","SQL","MySQL","PostgreSQL",
+    "MongoDB","Redis","Cassandra","SQLite","Firebase","Supabase","Docker","Kubernetes","AWS",
+    "Azure","GCP","Terraform","Ansible","Jenkins","Linux","Bash","Git","GitHub","GitLab",
+    "CI/CD","Nginx","Apache","HTML","CSS","Tailwind","Bootstrap","Sass","Webpack","Vite",
+    "FastAPI","Django","Flask","Spring","Express","Next.js","Nest.js","Laravel","TensorFlow",
+    "PyTorch","Keras","scikit-learn","pandas","numpy","OpenCV","Machine Learning",
+    "Deep Learning","NLP","Computer Vision","Data Science","REST","GraphQL","gRPC",
+    "WebSocket","Microservices","Agile","Scrum","Figma","Photoshop","Adobe XD","Sketch",
+    "Solidity","Web3","Ethereum","Blockchain","Smart Contracts","Penetration Testing",
+    "Networking","Cybersecurity","Cryptography",
+]
+
+# Spellings that should count as a canonical ALL_TECH entry
+SKILL_ALIASES = {
+    "Node.js":"Node","NodeJS":"Node","React.js":"React","ReactJS":"React","Vue.js":"Vue","VueJS":"Vue",
+    "Angular.js":"Angular","AngularJS":"Angular","Express.js":"Express","Golang":"Go","JS":"JavaScript",
+    "Postgres":"PostgreSQL","Mongo":"MongoDB","k8s":"Kubernetes","sklearn":"scikit-learn",
+    "Amazon Web Services":"AWS","Google Cloud":"GCP","Microsoft Azure":"Azure","RESTful":"REST",
+    "REST API":"REST","REST APIs":"REST","Natural Language Processing":"NLP","Shell Scripting":"Bash",
+}
+
+
+
+def _trie_regex(words) -> str:
+    """Prefix-sharing alternation (e.g. "c(?:\\+\\+|\\#)?") so the regex engine walks the vocabulary like a trie."""
+    trie: dict = {}
+    for w in words:
+        node = trie
+        for ch in w: node = node.setdefault(ch, {})
+        node[""] = {}
+    def build(node: dict) -> str:
+        alts = [re.escape(ch) + build(node[ch]) for ch in sorted(k for k in node if k)]
+        if not alts: return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        return f"(?:{body})?" if "" in node else body
+    return build(trie)
+
+
+_SKILL_CANON = {s.lower(): s for s in ALL_TECH} | {a.lower(): c for a, c in SKILL_ALIASES.items()}
+_SKILL_ORDER = {s: i for i, s in enumerate(ALL_TECH)}
+# Greedy optionals try the longest spelling first, so "C++" wins over "C" and "Node.js" over "Node".
+# The lookarounds replace \b, which never matches after a trailing "+" or "#"; a version may follow
+# those ("C++17"). Names that double as file extensions don't match straight after "word." so
+# "Web3.js" or "main.go" don't count, while a dot between two skills ("AWS.Docker") still separates them.
+_EXTENSION_SKILLS = ("js", "c", "go", "r")
+_SKILL_RE = re.compile(r"(?<!\w)(?!(?<=\w\.)(?:" + "|".join(_EXTENSION_SKILLS) + r")(?![\w+#]))("
+                       + _trie_regex(_SKILL_CANON) + r")(?:(?<=[+#])\d+)?(?![\w+#])", re.IGNORECASE)
+
+
+def match_skills(text: str) -> list:
+    """All ALL_TECH skills mentioned in text, found in a single regex pass, in ALL_TECH order."""
+    found = {_SKILL_CANON[m.group(1).lower()] for m in _SKILL_RE.finditer(text)}
+    return sorted(found, key=_SKILL_ORDER.__getitem__)
+
+
 def parse_resume(text: str) -> dict:
     lines = [l.strip() for l in text.split("\n") if l.strip()]
     name  = "Candidate"
@@ -281,20 +1862,7 @@ def parse_resume(text: str) -> dict:
     email = m.group(0) if (m := re.search(r'[\w\.\-\+]+@[\w\.-]+\.\w+', text)) else ""
     phone = m.group(0).strip() if (m := re.search(r'[\+]?[\d\s\-\(\)]{10,15}', text)) else ""
 
-    ALL_TECH = [
-        "Python","JavaScript","TypeScript","React","Node","Angular","Vue","Java","C","C++","C#",
-        "Go","Rust","Swift","Kotlin","PHP","Ruby","Scala","R","MATLAB","SQL","MySQL","PostgreSQL",
-        "MongoDB","Redis","Cassandra","SQLite","Firebase","Supabase","Docker","Kubernetes","AWS",
-        "Azure","GCP","Terraform","Ansible","Jenkins","Linux","Bash","Git","GitHub","GitLab",
-        "CI/CD","Nginx","Apache","HTML","CSS","Tailwind","Bootstrap","Sass","Webpack","Vite",
-        "FastAPI","Django","Flask","Spring","Express","Next.js","Nest.js","Laravel","TensorFlow",
-        "PyTorch","Keras","scikit-learn","pandas","numpy","OpenCV","Machine Learning",
-        "Deep Learning","NLP","Computer Vision","Data Science","REST","GraphQL","gRPC",
-        "WebSocket","Microservices","Agile","Scrum","Figma","Photoshop","Adobe XD","Sketch",
-        "Solidity","Web3","Ethereum","Blockchain","Smart Contracts","Penetration Testing",
-        "Networking","Cybersecurity","Cryptography",
-    ]
-    found_skills = [s for s in ALL_TECH if re.search(rf'\b{re.escape(s)}\b', text, re.IGNORECASE)]
+    found_skills = match_skills(text)
 
     edu = []
     for m in re.finditer(r'(B\.?Tech|B\.?E\.?|B\.?Sc|M\.?Tech|M\.?Sc|MBA|PhD|Bachelor|Master|Diploma|B\.?C\.?A|M\.?C\.?A)[^\n]{0,80}', text, re.IGNORECASE):
@@ -309,35 +1877,173 @@ def parse_resume(text: str) -> dict:
     return {"name":name,"email":email,"phone":phone,"skills":found_skills,"education":edu,"experience":exp,"projects":[]}
 
 
+_HIGHLIGHT_RE = re.compile(r"\b(buil[dt]|develop|design|implement|creat|led\b|lead|improv|reduc|increas|optimi[sz]|"
+                           r"deploy|engineer|automat|launch|migrat|train|won\b|publish)|\d+\s*(%|x\b|\+|k\b)", re.I)
+
+
+def build_digest(text: str, profile: dict) -> str:
+    """Compact, structured stand-in for the raw resume: parsed fields plus achievement lines."""
+    head = [f"Name: {profile.get('name', 'Candidate')}", f"Skills: {', '.join(profile.get('skills', [])) or 'none listed'}"]
+    if profile.get("experience"): head.append("Experience: " + "; ".join(dict.fromkeys(e["title"] for e in profile["experience"])))
+    if profile.get("education"):  head.append("Education: " + "; ".join(dict.fromkeys(e["degree"] for e in profile["education"])))
+    used, picked = estimate_tokens("\n".join(head)) + 2, []
+    for line in dict.fromkeys(l.strip(" •-*\t") for l in text.split("\n")):
+        if 25 <= len(line) <= 240 and "@" not in line and _HIGHLIGHT_RE.search(line):
+            n = estimate_tokens(line)
+            if used + n > DIGEST_TOKENS: break
+            picked.append("- " + line); used += n
+    return "\n".join(head + (["Highlights:"] + picked if picked else []))
+
+
+def resume_digest(session: dict) -> str:
+    """Built once per resume and kept on the session, so later prompts reuse it."""
+    key = session.get("resume_hash") or text_hash(resume_text(session))
+    if (d := session.get("digest")) and d["hash"] == key:
+        return d["text"]
+    text = digest_cache.get(key) or digest_cache.put(key, build_digest(resume_text(session), cached_profile(session)))
+    session["digest"] = {"hash": key, "text": text}
+    return text
+
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # GAP ANALYSIS
 # ═══════════════════════════════════════════════════════════════════════════════
+SEVERITY_WEIGHTS = {"critical": 3, "moderate": 2, "minor": 1}
+
+# Specific skills that satisfy a broader requirement but share no whole token with it
+SKILL_IMPLIES = {"MySQL": ["SQL"], "PostgreSQL": ["SQL"], "SQLite": ["SQL"], "GitHub": ["Git"], "GitLab": ["Git"]}
+_SKILL_TOKEN_RE = re.compile(r"[a-z0-9+#]+")
+
+
+def _skill_norm(skill: str) -> str:
+    k = skill.strip().lower()
+    k = _SKILL_CANON.get(k, k).lower()               # "JS" → "javascript", "Golang" → "go"
+    return k[:-3] if k.endswith(".js") else k        # "Web3.js" ≡ "Web3"
+
+
+class SkillMatcher:
+    """Which required skills (across every role) each skill satisfies, as a precomputed boolean matrix.
+
+    A skill satisfies a requirement when both canonicalise to the same name, when
+    SKILL_IMPLIES says so, or when a multi-word requirement's tokens all appear in
+    the skill ("Applied Machine Learning" → "Machine Learning"). Single-word
+    requirements need a name match, so "Go" never satisfies "MongoDB" and
+    "Penetration Testing" never satisfies "Testing". The (skills × requirements)
+    cover matrix is built once, so a profile's coverage is one reduction over its
+    rows and a batch of profiles is one matrix product.
+    """
+
+    def __init__(self, vocab, required):
+        self.required = sorted(required)                       # lower-cased requirement keys, column order
+        self.col      = {r: j for j, r in enumerate(self.required)}
+        names         = sorted(set(vocab) | set(self.required))
+        self.row      = {k: i for i, k in enumerate(names)} | {a: names.index(c.lower()) for a, c in _SKILL_CANON.items() if c.lower() in names}
+        self.req_norms  = [_skill_norm(r) for r in self.required]
+        self.req_tokens = [frozenset(_SKILL_TOKEN_RE.findall(k)) for k in self.req_norms]
+        self.implied    = {(_skill_norm(s), _skill_norm(r)) for s, rs in SKILL_IMPLIES.items() for r in rs}
+        self.cover = np.array([self._cover_row(k) for k in names], dtype=bool).reshape(len(names), len(self.required))
+        self._extra: dict = {}                                 # cover rows of skills outside the vocabulary
+
+    def _cover_row(self, skill: str) -> list:
+        k      = _skill_norm(skill)
+        tokens = frozenset(_SKILL_TOKEN_RE.findall(k))
+        return [k == r or (k, r) in self.implied or len(rt) > 1 and rt <= tokens
+                for r, rt in zip(self.req_norms, self.req_tokens)]
+
+    def _unknown_row(self, skill: str) -> np.ndarray:
+        row = self._extra.get(skill)
+        if row is None:
+            row = np.array(self._cover_row(skill), dtype=bool)
+            if len(self._extra) >= 4096: self._extra.clear()
+            self._extra[skill] = row
+        return row
+
+    def coverage(self, skills: list) -> np.ndarray:
+        """Boolean vector over self.required: which requirements the skills satisfy."""
+        keys = [s.strip().lower() for s in skills]
+        cov  = self.cover[[self.row[k] for k in keys if k in self.row]].any(axis=0)
+        for k in keys:
+            if k not in self.row: cov |= self._unknown_row(k)
+        return cov
+
+    def coverage_batch(self, skill_lists: list) -> np.ndarray:
+        """(profiles × requirements) boolean coverage for many skill lists in one matrix product."""
+        x = np.zeros((len(skill_lists), len(self.cover)), dtype=np.float32)
+        unknown = []
+        for i, skills in enumerate(skill_lists):
+            for s in skills:
+                k = s.strip().lower()
+                if k in self.row: x[i, self.row[k]] = 1
+                else: unknown.append((i, k))
+        cov = x @ self.cover.astype(np.float32) > 0
+        for i, k in unknown: cov[i] |= self._unknown_row(k)
+        return cov
+
+    def weights(self, tiers: dict) -> np.ndarray:
+        w = np.zeros(len(self.required))
+        for sev, t in tiers.items():
+            w[[self.col[s.lower()] for s in t]] = SEVERITY_WEIGHTS[sev]
+        return w
+
+
+def _build_role_index(req: dict) -> dict:
+    tiers = {sev: tuple(req[sev]) for sev in SEVERITY_WEIGHTS}
+    return {"tiers": tiers, "keys": frozenset(s.lower() for t in tiers.values() for s in t),
+            "total_weight": sum(len(t)*SEVERITY_WEIGHTS[sev] for sev, t in tiers.items()),
+            "courses": req["courses"]}
+
+
+# Compiled once at import: role → tiers/weights, the skill cover matrix, and one weight row per role
+ROLE_INDEX    = {role: _build_role_index(req) for role, req in ROLE_REQUIREMENTS.items()}
+DEFAULT_INDEX = _build_role_index(DEFAULT_ROLE_REQ)
+SKILL_MATCHER = SkillMatcher({s.lower() for s in ALL_TECH},
+                            set().union(DEFAULT_INDEX["keys"], *(ix["keys"] for ix in ROLE_INDEX.values())))
+for _ix in (*ROLE_INDEX.values(), DEFAULT_INDEX): _ix["weights"] = SKILL_MATCHER.weights(_ix["tiers"])
+_ROLE_NAMES   = list(ROLE_INDEX)
+_ROLE_WEIGHTS = np.stack([ROLE_INDEX[r]["weights"] for r in _ROLE_NAMES])
+_ROLE_TOTALS  = np.array([ROLE_INDEX[r]["total_weight"] for r in _ROLE_NAMES], dtype=float)
+
+
+def _match_scores(sw, total_weight, experience_level: str) -> np.ndarray:
+    score = np.clip((sw / np.maximum(total_weight, 1) * 100).astype(int), 20, 95)
+    if experience_level in ("1-3 years","3+ years"):
+        score = np.where(score < 80, np.minimum(85, score + 8), score)
+    return score
+
+
+def score_profiles(profiles: list, experience_level: str = "fresher") -> np.ndarray:
+    """Match scores of many profiles against every role, as a (profiles × roles) matrix in ROLE_INDEX order."""
+    cov = SKILL_MATCHER.coverage_batch([p.get("skills", []) for p in profiles])
+    return _match_scores(cov @ _ROLE_WEIGHTS.T, _ROLE_TOTALS, experience_level)
+
+
+def rank_roles(profile: dict, experience_level: str = "fresher") -> list:
+    """Score one profile against every known role, best fit first."""
+    cov    = SKILL_MATCHER.coverage(profile.get("skills", []))
+    scores = _match_scores(_ROLE_WEIGHTS @ cov, _ROLE_TOTALS, experience_level)
+    ranked = [{"role": role, "matchScore": int(score),
+               "missing_critical": [s for s in ROLE_INDEX[role]["tiers"]["critical"] if not cov[SKILL_MATCHER.col[s.lower()]]][:5]}
+              for role, score in zip(_ROLE_NAMES, scores)]
+    ranked.sort(key=lambda r: r["matchScore"], reverse=True)
+    return ranked
+
+
 def analyze_gaps(profile: dict, target_role: str, experience_level: str) -> dict:
-    req         = ROLE_REQUIREMENTS.get(target_role, DEFAULT_ROLE_REQ)
-    user_skills = set(s.lower() for s in profile.get("skills", []))
+    ix      = ROLE_INDEX.get(target_role, DEFAULT_INDEX)
+    covered = SKILL_MATCHER.coverage(profile.get("skills", []))
 
     def has(skill: str) -> bool:
-        s = skill.lower()
-        return s in user_skills or any(s in us or us in s for us in user_skills)
-
-    crit, mod, minor = req["critical"], req["moderate"], req["minor"]
-    ch, mh, nih = sum(1 for s in crit if has(s)), sum(1 for s in mod if has(s)), sum(1 for s in minor if has(s))
-    tw   = len(crit)*3 + len(mod)*2 + len(minor)
-    sw   = ch*3 + mh*2 + nih
-    score = min(95, max(20, int(sw/max(tw,1)*100)))
-    if experience_level in ("1-3 years","3+ years") and score < 80:
-        score = min(85, score + 8)
-
-    gaps = []
-    for s in crit:
-        if not has(s): gaps.append({"skill":s,"severity":"critical","reason":f"Core requirement for {target_role} — in 95%+ of job postings"})
-    for s in mod:
-        if not has(s) and sum(1 for g in gaps if g["severity"]=="moderate") < 3:
-            gaps.append({"skill":s,"severity":"moderate","reason":f"Highly preferred for {target_role} roles"})
-    for s in minor:
-        if not has(s) and sum(1 for g in gaps if g["severity"]=="minor") < 2:
-            gaps.append({"skill":s,"severity":"minor","reason":"Nice-to-have that boosts your profile"})
+        return bool(covered[SKILL_MATCHER.col[skill.lower()]])
+
+    crit, mod, minor = ix["tiers"]["critical"], ix["tiers"]["moderate"], ix["tiers"]["minor"]
+    score = int(_match_scores(ix["weights"] @ covered, ix["total_weight"], experience_level))
 
+    gaps = [{"skill":s,"severity":"critical","reason":f"Core requirement for {target_role} — in 95%+ of job postings"}
+            for s in crit if not has(s)]
+    gaps += [{"skill":s,"severity":"moderate","reason":f"Highly preferred for {target_role} roles"}
+             for s in mod if not has(s)][:3]
+    gaps += [{"skill":s,"severity":"minor","reason":"Nice-to-have that boosts your profile"}
+             for s in minor if not has(s)][:2]
     strengths = [s for s in crit+mod if has(s)][:5] or profile.get("skills",["Programming"])[:3]
 
     skill_bars = []
@@ -363,7 +2069,190 @@ def analyze_gaps(profile: dict, target_role: str, experience_level: str) -> dict
         summary = f"You're on your way to {target_role}. Focus intensively on {', '.join(crit_missing[:2]) if crit_missing else 'required skills'} — these appear in 90%+ of job postings."
 
     return {"matchScore":score,"summary":summary,"strengths":strengths,"gaps":gaps[:6],"skillBars":skill_bars[:6],
-            "roadmap":roadmap,"courses":req["courses"][:3],"missing_skills":crit_missing[:5]}
+            "roadmap":roadmap,"courses":ix["courses"][:3],"missing_skills":crit_missing[:5]}
+
+
+def cached_profile(session: dict) -> dict:
+    key = session.get("resume_hash") or text_hash(resume_text(session))
+    return profile_cache.get(key) or profile_cache.put(key, parse_resume(resume_text(session)))
+
+
+def cached_gaps(profile: dict, target_role: str, experience_level: str) -> dict:
+    # analyze_gaps only reads the skill list, so identical skills share an entry
+    key = (tuple(profile.get("skills", [])), target_role, experience_level)
+    return gap_cache.get(key) or gap_cache.put(key, analyze_gaps(profile, target_role, experience_level))
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# JOB INDEX
+# ═══════════════════════════════════════════════════════════════════════════════
+BM25_K1, BM25_B = 1.2, 0.75
+
+
+class JobIndex:
+    """Skill inverted index over job listings (title + description, ALL_TECH vocabulary).
+
+    Term weights are BM25, precomputed into a (jobs × skills) matrix, so ranking a
+    candidate against every listing is a couple of matrix-vector products.
+    """
+
+    def __init__(self, listings: list):
+        self.listings = listings
+        tf = np.zeros((len(listings), len(ALL_TECH)), dtype=np.float32)
+        for i, j in enumerate(listings):
+            text = f"{j.get('title','')}\n{j.get('title','')}\n{j.get('description','')}\n{j.get('keywords','')}"   # title counts twice
+            for m in _SKILL_RE.finditer(text):
+                tf[i, _SKILL_ORDER[_SKILL_CANON[m.group(1).lower()]]] += 1
+        self.present = tf > 0                                # the inverted index, as a boolean matrix
+        self.n_skills = self.present.sum(axis=1)
+        df  = self.present.sum(axis=0)
+        idf = np.log1p((len(listings) - df + 0.5) / (df + 0.5)).astype(np.float32)
+        dl  = tf.sum(axis=1, keepdims=True)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * dl / max(float(dl.mean()) if len(listings) else 1.0, 1.0))
+        self.weights = tf * (BM25_K1 + 1) / (tf + norm) * idf
+        self.curated = np.array([j.get("match", 0) for j in listings], dtype=np.float32)   # hand-set fit of mock postings
+
+    def __len__(self) -> int:
+        return len(self.listings)
+
+    def rank(self, skills: list, k: int, base_match: int = 70) -> list:
+        """Top-k listings for a candidate, with match %, skills_matched and skills_missing."""
+        if not self.listings: return []
+        q = np.zeros(len(ALL_TECH), dtype=np.float32)
+        q[[_SKILL_ORDER[s] for s in skills if s in _SKILL_ORDER]] = 1
+        bm25     = self.weights @ q
+        coverage = np.divide(self.present @ q, self.n_skills, out=np.zeros_like(bm25), where=self.n_skills > 0)
+        relevance = 0.7 * coverage + 0.3 * bm25 / max(float(bm25.max()), 1e-6)
+        match = np.where(self.n_skills > 0, 50 + 49 * relevance, base_match)
+        # mock postings keep their curated fit, nudged by the gap score, averaged with the skill match
+        prior = np.clip(self.curated + (base_match - 70) // 5, 50, 99)
+        match = np.where(self.curated > 0, (prior + match) / 2, match).astype(int)
+        top   = np.argsort(-(match + relevance), kind="stable")[:k]
+        out = []
+        for i in top:
+            row = self.present[i]
+            j   = self.listings[i]
+            out.append({**{f: v for f, v in j.items() if f != "keywords"}, "match": int(match[i]),
+                        "skills_matched": [ALL_TECH[t] for t in np.flatnonzero(row & (q > 0))],
+                        "skills_missing": [ALL_TECH[t] for t in np.flatnonzero(row & (q == 0))],
+                        "description": (j["description"][:120]+"...") if j.get("description") else ""})
+        return out
+
+
+# mock postings have no description; JobIndex indexes their own "keywords" instead
+MOCK_INDEX         = {role: JobIndex(jobs) for role, jobs in MOCK_JOBS.items()}
+DEFAULT_MOCK_INDEX = JobIndex(DEFAULT_JOBS)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# RULE ENGINE
+# ═══════════════════════════════════════════════════════════════════════════════
+# Deterministic, template-driven versions of the three generators, built from
+# ROLE_REQUIREMENTS and the analyze_gaps output. They return the same shapes as
+# the LLM prompts ask for, so they serve both as the fallback for unusable LLM
+# output and as the load-shedding path (see should_shed).
+_GAP_QUESTIONS = [
+    ("{skill} is a core requirement for {role} roles. How would you use it to build a production feature, "
+     "and what pitfalls would you watch for?", "Practical depth in {skill}",
+     ["Walk through a concrete design", "Name common failure modes", "Explain how you'd test it"]),
+    ("Explain how {skill} works under the hood. Which design decision would you make differently because of it?",
+     "Conceptual understanding of {skill}",
+     ["Start from first principles", "Compare with an alternative", "Tie it back to performance or reliability"]),
+    ("Imagine your team adopts {skill} next sprint. How would you get productive with it in two weeks?",
+     "Learning strategy + ramp-up plan",
+     ["Break the learning into milestones", "Mention docs and small prototypes", "Say how you'd validate progress"]),
+]
+_STRENGTH_QUESTIONS = [
+    ("You list {skill} on your resume. Tell me about the hardest problem you solved with it and the trade-offs you weighed.",
+     "Hands-on experience + trade-off thinking",
+     ["Use the STAR format", "Quantify the impact", "Mention what you'd do differently"]),
+    ("How would you debug a performance problem in a {skill} codebase you didn't write?",
+     "Debugging approach with {skill}",
+     ["Reproduce and measure first", "Narrow down with profiling", "Explain how you'd prevent regressions"]),
+]
+_BEHAVIOURAL_QUESTIONS = [
+    ("Tell me about a time you had to learn a new technology quickly to deliver a project. What was the outcome?",
+     "Adaptability + ownership", ["Use the STAR format", "Be specific about what you learned", "Quantify the result"]),
+    ("Describe a disagreement with a teammate about a technical decision. How was it resolved?",
+     "Collaboration + communication", ["Show you listened", "Explain the evidence used", "Describe the final outcome"]),
+]
+_PROJECT_TEMPLATES = [
+    ("{role} Insights Dashboard", "End-to-end app turning real data into decisions",
+     ["Authentication and user roles", "Export reports as PDF"]),
+    ("Production-Ready {gap} Service", "A deployable service built the way teams ship it",
+     ["Rate limiting and caching", "Load test results in the README"]),
+]
+_WEEK_THEMES = ["Foundation", "Core Skills", "Applied Practice", "Portfolio & Applications"]
+
+
+def _pick(options: list, key: str, i: int = 0):
+    """Stable choice per key; consecutive i rotate through the options so a set doesn't repeat itself."""
+    return options[(int(hashlib.md5(key.encode()).hexdigest(), 16) + i) % len(options)]
+
+
+def rule_questions(profile: dict, gap: dict, target_role: str, n: int = 3) -> list:
+    gaps       = [g["skill"] for g in gap.get("gaps", [])]
+    strengths  = gap.get("strengths") or profile.get("skills", [])
+    behavioural = max(1, n // 3) if n > 1 else 0
+    technical  = [("gap", s) for s in gaps][:n - behavioural]
+    technical += [("strength", s) for s in strengths if ("strength", s) not in technical][:n - behavioural - len(technical)]
+    out = []
+    for i, (kind, skill) in enumerate(technical):
+        q, test, hints = _pick(_GAP_QUESTIONS if kind == "gap" else _STRENGTH_QUESTIONS, target_role, i)
+        out.append({"type": "technical", "difficulty": "medium" if kind == "gap" else "hard",
+                    "question": q.format(skill=skill, role=target_role), "what_they_test": test.format(skill=skill),
+                    "good_answer_hints": hints})
+    for i in range(n - len(out)):
+        q, test, hints = _BEHAVIOURAL_QUESTIONS[i % len(_BEHAVIOURAL_QUESTIONS)]
+        out.append({"type": "behavioral", "difficulty": "medium", "question": q, "what_they_test": test,
+                    "good_answer_hints": hints})
+    return [{"id": i + 1, **q} for i, q in enumerate(out)]
+
+
+def rule_projects(profile: dict, gap: dict, target_role: str) -> list:
+    gaps      = [g["skill"] for g in gap.get("gaps", [])] or ["Testing", "Docker"]
+    strengths = (gap.get("strengths") or profile.get("skills") or ["Python"])
+    score     = gap.get("matchScore", 50)
+    level     = "Beginner" if score < 40 else "Intermediate" if score < 75 else "Advanced"
+    out = []
+    for i, (title, tagline, bonus) in enumerate(_PROJECT_TEMPLATES):
+        closes = gaps[2*i:2*i + 2] or gaps[:2]
+        base   = strengths[i % len(strengths)]
+        out.append({"title": title.format(role=target_role, gap=closes[0]), "tagline": tagline,
+                    "difficulty": level, "time_to_build": "2-3 weeks" if i == 0 else "3-4 weeks",
+                    "tech_stack": list(dict.fromkeys([base, *closes, "Git"])),
+                    "why_impressive": f"Shows hands-on {' and '.join(closes)} on top of your {base} — what {target_role} postings ask for",
+                    "gap_it_closes": ", ".join(closes),
+                    "steps": [f"Set up the repo with {base}, linting and CI",
+                              f"Build the core feature using {closes[0]}",
+                              f"Integrate {closes[-1]} end to end" if len(closes) > 1 else "Add automated tests for the core flow",
+                              "Write tests and a clear README", "Deploy publicly and add a live demo link"],
+                    "bonus_features": bonus,
+                    "github_readme_tip": "Add an architecture diagram, screenshots and the live demo link"})
+    return out
+
+
+def rule_schedule(gap: dict, target_role: str) -> dict:
+    skills  = [g["skill"] for g in gap.get("gaps", [])][:4] or ["core skills"]
+    courses = gap.get("courses") or ROLE_REQUIREMENTS.get(target_role, DEFAULT_ROLE_REQ)["courses"]
+    weeks   = []
+    for w in range(4):
+        skill, course, day = skills[w % len(skills)], courses[w % len(courses)], w * 7 + 1
+        tasks = [{"title": f"{course['title']} ({course['platform']})", "description": f"Focus: {skill}. {course.get('why', '')}".strip(),
+                  "day_offset": day, "duration_hours": 2, "type": "course"},
+                 {"title": f"Hands-on {skill} practice", "description": f"Small exercises applying {skill}",
+                  "day_offset": day + 2, "duration_hours": 2, "type": "practice"}]
+        if w >= 2:
+            tasks.append({"title": "Portfolio project milestone", "description": f"Use {skill} in your portfolio project",
+                          "day_offset": day + 4, "duration_hours": 3, "type": "project"})
+        if w == 3:
+            tasks.append({"title": f"Apply to 5 {target_role} roles", "description": "Tailor your resume for each posting",
+                          "day_offset": day + 5, "duration_hours": 2, "type": "application"})
+        weeks.append({"week": w + 1, "theme": _WEEK_THEMES[w], "focus": skill, "daily_hours": 2, "tasks": tasks})
+    return {"title": f"Your 4-Week {target_role} Roadmap",
+            "total_hours": sum(t["duration_hours"] for wk in weeks for t in wk["tasks"]), "weeks": weeks,
+            "milestones": [{"week": 2, "goal": f"Finish {courses[0]['title']}"},
+                           {"week": 4, "goal": "Ship one portfolio project and apply to 5 jobs"}]}
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -398,6 +2287,10 @@ class AnalyzeRequest(BaseModel):
     session_id: str; target_role: str; experience_level: str = "fresher"
     career_field: Optional[str] = ""; job_types: Optional[List[str]] = []
     preferred_location: Optional[str] = ""; salary_range: Optional[str] = ""; career_goal: Optional[str] = ""
+    pregenerate: Optional[bool] = None   # warm questions/projects/schedule in the background; default PREGENERATE
+
+class BestFitRequest(BaseModel):
+    session_id: str; experience_level: str = "fresher"; top_n: int = 3
 
 class ChatRequest(BaseModel):
     session_id: str; message: str
@@ -411,6 +2304,14 @@ class QuestionsRequest(BaseModel):
 class EvaluateRequest(BaseModel):
     session_id: str; question: str; answer: str
 
+class BatchAnswer(BaseModel):
+    answer: str
+    question_id: Optional[int] = None   # id in current_questions; defaults to the answer's position
+    question: Optional[str] = None      # overrides the stored question text
+
+class EvaluateBatchRequest(BaseModel):
+    session_id: str; answers: List[BatchAnswer]
+
 class ProjectsRequest(BaseModel):
     session_id: str
 
@@ -421,6 +2322,59 @@ class FindJobsRequest(BaseModel):
     session_id: str
     location: Optional[str] = "India"
     num_results: int = 5
+    page: int = 1
+
+class FullReportRequest(AnalyzeRequest):
+    num_questions: int = 3; location: Optional[str] = ""; num_results: int = 5
+
+
+# ── LLM response schemas ──────────────────────────────────────────────────────
+# Lenient: only the fields the frontend can't do without are required, extra keys
+# are kept, and everything else gets a default.
+class LLMOutput(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+class TailorResult(LLMOutput):
+    tailored_bullets: List[str] = Field(min_length=1)
+    ats_score_before: int = 0; ats_score_after: int = 0
+    key_matches: List[str] = []; missing_keywords: List[str] = []
+    summary_statement: str = ""; tips: List[str] = []
+
+class InterviewQuestion(LLMOutput):
+    question: str
+    id: int = 0; type: str = "technical"; difficulty: str = "medium"
+    what_they_test: str = ""; good_answer_hints: List[str] = []
+
+class Evaluation(LLMOutput):
+    score: int = Field(ge=0, le=10); verdict: str
+    score_breakdown: dict = {}; strengths: List[str] = []; improvements: List[str] = []
+    ideal_answer_summary: str = ""; follow_up_question: str = ""
+
+class PortfolioProject(LLMOutput):
+    title: str
+    tagline: str = ""; difficulty: str = "Intermediate"; time_to_build: str = ""
+    tech_stack: List[str] = []; why_impressive: str = ""; gap_it_closes: str = ""
+    steps: List[str] = []; bonus_features: List[str] = []; github_readme_tip: str = ""
+
+class ScheduleTask(LLMOutput):
+    title: str
+    description: str = ""; day_offset: int = 1; duration_hours: float = 1; type: str = "course"
+
+class ScheduleWeek(LLMOutput):
+    week: int
+    theme: str = ""; focus: str = ""; daily_hours: float = 2; tasks: List[ScheduleTask] = []
+
+class StudySchedule(LLMOutput):
+    weeks: List[ScheduleWeek] = Field(min_length=1)
+    title: str = ""; total_hours: float = 0; milestones: List[dict] = []
+
+RESPONSE_SCHEMAS = {
+    "tailor-resume":      TypeAdapter(TailorResult),
+    "generate-questions": TypeAdapter(List[InterviewQuestion]),
+    "evaluate-answer":    TypeAdapter(Evaluation),
+    "generate-projects":  TypeAdapter(List[PortfolioProject]),
+    "generate-schedule":  TypeAdapter(StudySchedule),
+}
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -434,7 +2388,14 @@ def root():
 @app.get("/health")
 def health():
     return {"status":"online","groq_configured":bool(GROQ_API_KEY),"model":MODEL_NAME,
-            "adzuna_configured":bool(ADZUNA_APP_ID and ADZUNA_APP_KEY)}
+            "adzuna_configured":bool(ADZUNA_APP_ID and ADZUNA_APP_KEY),
+            "sessions":sessions.stats(),"pdf_pool":pdf_pool_metrics(),"llm":llm_stats,"llm_tokens":token_stats,"llm_json":json_metrics(),
+            "llm_scheduler":{m: sc.metrics() for m, sc in schedulers.items()},
+            "llm_router":router.metrics(),
+            "upstreams":{name: u.metrics() for name, u in upstreams.items()},
+            "job_cache":job_cache.metrics(),"tasks":task_queue.metrics(),"pregen":pregen.metrics(),"interview":interview_stats,"load_shedding":shedding_metrics(),
+            "caches":{"pdf":pdf_cache.stats(),"profile":profile_cache.stats(),"gap":gap_cache.stats(),
+                      "llm":llm_cache.stats() if llm_cache else None}}
 
 
 # ── 1. UPLOAD RESUME ──────────────────────────────────────────────────────────
@@ -442,52 +2403,168 @@ def health():
 async def upload_resume(file: UploadFile = File(...)):
     if not file.filename.lower().endswith(".pdf"):
         raise HTTPException(400, "Only PDF files accepted.")
-    pdf_bytes = await file.read()
-    text = ""
-    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
-        for page in pdf.pages:
-            t = page.extract_text()
-            if t: text += t + "\n"
+    path, size, digest = await spool_upload(file)
+    try:
+        result = pdf_cache.get(digest) or await extract_pdf(path)
+    finally:
+        os.unlink(path)
+    text = result["text"]
     if len(text.strip()) < 50:
         raise HTTPException(422, "Could not extract text from PDF.")
+    pdf_cache.put(digest, result)
     sid = str(uuid.uuid4())[:8]
-    sessions[sid] = {"resume_text": text.strip(), "messages": []}
-    return {"session_id": sid, "chars": len(text)}
+    text = text.strip()
+    await session_put(sid, {"resume_z": pack_text(text), "resume_hash": text_hash(text), "messages": [], "memory": ""})
+    return {"session_id": sid, "chars": len(text), "bytes": size,
+            "pages": result["pages"], "truncated": result["truncated"]}
 
 
 # ── 2. ANALYZE ────────────────────────────────────────────────────────────────
-@app.post("/analyze")
-async def analyze(req: AnalyzeRequest):
-    session = sessions.get(req.session_id)
-    if not session: raise HTTPException(404, "Session not found.")
-    profile = parse_resume(session["resume_text"])
-    gap     = analyze_gaps(profile, req.target_role, req.experience_level)
-    sessions[req.session_id].update({
+def apply_analysis(session: dict, req: AnalyzeRequest) -> tuple:
+    profile = cached_profile(session)
+    gap     = cached_gaps(profile, req.target_role, req.experience_level)
+    if (session.get("target_role"), session.get("gap")) != (req.target_role, gap):
+        pregen.invalidate(req.session_id)
+    session.update({
         "profile": profile, "gap": gap, "target_role": req.target_role,
         "career_goal": req.career_goal, "preferences": {
             "field": req.career_field, "job_types": req.job_types,
             "location": req.preferred_location, "salary": req.salary_range,
         }
     })
+    resume_digest(session)   # built once here; tailor/questions/chat reuse it from the session
+    return profile, gap
+
+
+@app.post("/analyze")
+async def analyze(req: AnalyzeRequest):
+    session = await session_get(req.session_id)
+    if not session: raise HTTPException(404, "Session not found.")
+    profile, gap = apply_analysis(session, req)
+    await session_put(req.session_id, session)
+    if req.pregenerate if req.pregenerate is not None else PREGENERATE:
+        pregen.start(req.session_id, session)   # tasks start after this response is sent
     return {"session_id": req.session_id, "profile": profile, "gap_analysis": gap}
 
 
-# ── 3. TAILOR RESUME ──────────────────────────────────────────────────────────
-@app.post("/tailor-resume")
-async def tailor_resume(req: TailorRequest):
-    session = sessions.get(req.session_id)
+# ── 2a. BATCH ANALYZE ─────────────────────────────────────────────────────────
+def _unzip_pdfs(zip_path: str) -> list:
+    """Extract the PDFs in a ZIP to temp files, hashing as they are written; returns [(name, path, sha256)]."""
+    out, digests = [], []
+    try:
+        with zipfile.ZipFile(zip_path) as zf:
+            for info in zf.infolist():
+                name = os.path.basename(info.filename)
+                if info.is_dir() or not name.lower().endswith(".pdf") or info.filename.startswith("__MACOSX"): continue
+                if info.file_size > PDF_MAX_BYTES: raise HTTPException(413, f"{name} is larger than the PDF limit.")
+                if len(out) >= BATCH_MAX_FILES: raise HTTPException(413, f"At most {BATCH_MAX_FILES} PDFs per batch.")
+                with zf.open(info) as src, tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as dst:
+                    out.append((name, dst.name))
+                    digest = hashlib.sha256()
+                    while chunk := src.read(UPLOAD_CHUNK):
+                        digest.update(chunk); dst.write(chunk)
+                    digests.append(digest.hexdigest())
+    except BaseException:
+        for _, p in out: os.unlink(p)
+        raise
+    return [(name, path, d) for (name, path), d in zip(out, digests)]
+
+
+# one gate for every batch, so concurrent batches together still leave headroom for /upload-resume
+batch_gate = asyncio.Semaphore(max(1, PDF_QUEUE_LIMIT // 2))
+
+
+async def _batch_one(name: str, path: str, digest: str, roles: list, experience_level: str,
+                     gate: asyncio.Semaphore) -> dict:
+    result = pdf_cache.get(digest)
+    if result is None:
+        try:
+            async with gate:
+                result = await extract_pdf(path, wait=True)
+        except HTTPException as e:
+            return {"file": name, "error": e.detail}
+        pdf_cache.put(digest, result)
+    text = result["text"].strip()
+    if len(text) < 50:
+        return {"file": name, "error": "Could not extract text from PDF."}
+    profile = cached_profile({"resume_text": text, "resume_hash": text_hash(text)})
+    ranked  = rank_roles(profile, experience_level)
+    targets = roles or [r["role"] for r in ranked[:3]]
+    analyses = []
+    for role in targets:
+        gap = cached_gaps(profile, role, experience_level)
+        analyses.append({"role": role, "matchScore": gap["matchScore"], "summary": gap["summary"],
+                         "missing_skills": gap["missing_skills"], "gaps": gap["gaps"]})
+    return {"file": name, "name": profile["name"], "email": profile["email"], "skills": profile["skills"],
+            "pages": result["pages"], "analyses": analyses, "best_fit": ranked[0]["role"]}
+
+
+@app.post("/batch-analyze")
+async def batch_analyze(files: List[UploadFile] = File(...), target_roles: str = Form(""),
+                        experience_level: str = Form("fresher")):
+    """Cohort upload: PDFs and/or ZIPs of PDFs in, one NDJSON line per resume out as each finishes."""
+    roles, items = [r.strip() for r in target_roles.split(",") if r.strip()], []
+    try:
+        for file in files:
+            is_zip = file.filename.lower().endswith(".zip")
+            path, _, digest = await (spool_upload(file, BATCH_MAX_ZIP_BYTES, "ZIP") if is_zip else spool_upload(file))
+            if is_zip:
+                try:
+                    items += await asyncio.to_thread(_unzip_pdfs, path)
+                except zipfile.BadZipFile:
+                    raise HTTPException(400, f"{file.filename} is not a valid ZIP.")
+                finally:
+                    os.unlink(path)
+            elif file.filename.lower().endswith(".pdf"):
+                items.append((file.filename, path, digest))
+            else:
+                os.unlink(path)
+                raise HTTPException(400, f"{file.filename}: only PDF or ZIP files accepted.")
+            if len(items) > BATCH_MAX_FILES:
+                raise HTTPException(413, f"At most {BATCH_MAX_FILES} PDFs per batch.")
+    except BaseException:
+        for _, p, _ in items: os.unlink(p)
+        raise
+
+    async def lines():
+        t0, ok = time.monotonic(), 0
+        tasks = [asyncio.ensure_future(_batch_one(n, p, d, roles, experience_level, batch_gate)) for n, p, d in items]
+        try:
+            for done in asyncio.as_completed(tasks):
+                row = await done
+                ok += "error" not in row
+                yield json.dumps(row) + "\n"
+            elapsed = time.monotonic() - t0
+            yield json.dumps({"summary": {"files": len(items), "ok": ok, "failed": len(items) - ok,
+                                          "seconds": round(elapsed, 3),
+                                          "resumes_per_sec": round(len(items) / elapsed, 2) if elapsed else None}}) + "\n"
+        finally:
+            for t in tasks: t.cancel()
+            for _, p, _ in items:
+                if os.path.exists(p): os.unlink(p)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+# ── 2b. BEST-FIT ROLES ────────────────────────────────────────────────────────
+@app.post("/best-fit-roles")
+async def best_fit_roles(req: BestFitRequest):
+    session = await session_get(req.session_id)
     if not session: raise HTTPException(404, "Session not found.")
-    profile = session.get("profile", {})
+    profile = session.get("profile") or cached_profile(session)
+    return {"session_id": req.session_id, "roles": rank_roles(profile, req.experience_level)[:req.top_n]}
+
 
+# ── 3. TAILOR RESUME ──────────────────────────────────────────────────────────
+def tailor_prompt(session: dict, req: TailorRequest) -> dict:
     system = """You are an expert ATS resume optimizer. Rewrite resume bullet points to perfectly match a job description.
 Use strong action verbs (Built, Engineered, Led, Optimized, Deployed, Reduced).
 Include JD keywords naturally. Quantify achievements. Keep each bullet under 20 words.
 Return ONLY valid JSON."""
 
-    user = f"""Resume Skills: {', '.join(profile.get('skills', [])[:15])}
-Experience: {', '.join([e.get('title','') for e in profile.get('experience',[])])}
-Resume excerpt: {session['resume_text'][:1500]}
-Job Description: {req.job_description[:2000]}
+    user = f"""Resume:
+{resume_digest(session)}
+Job Description: <<job_description>>
 
 Return JSON:
 {{"ats_score_before":45,"ats_score_after":82,
@@ -497,21 +2574,29 @@ Return JSON:
   "summary_statement":"Full Stack Developer with 2+ years...",
   "tips":["Add Docker to skills","Quantify project impact"]}}"""
 
-    raw    = await ask_llm(system, user, temperature=0.3, max_tokens=1200, smart=True)
-    result = safe_json(raw)
-    if not result:
+    return build_prompt("tailor-resume", system, user, {"job_description": req.job_description},
+                        temperature=0.3, max_tokens=1200, smart=True)
+
+
+def tailor_finish(session: dict, req: TailorRequest, raw: str) -> dict:
+    profile = session.get("profile", {})
+    result  = parse_json("tailor-resume", raw)
+    if result is None:
         result = {"tailored_bullets":["• "+l for l in raw.split("\n") if l.strip()][:5],
                   "ats_score_before":50,"ats_score_after":75,"key_matches":profile.get("skills",[])[:4],
                   "missing_keywords":[],"tips":["Review and customize these bullets."]}
     return result
 
 
-# ── 4. GENERATE INTERVIEW QUESTIONS ──────────────────────────────────────────
-@app.post("/generate-questions")
-async def generate_questions(req: QuestionsRequest):
-    session = sessions.get(req.session_id)
+@app.post("/tailor-resume")
+async def tailor_resume(req: TailorRequest):
+    session = await session_get(req.session_id)
     if not session: raise HTTPException(404, "Session not found.")
-    profile     = session.get("profile", {})
+    return tailor_finish(session, req, await ask_llm(**tailor_prompt(session, req)))
+
+
+# ── 4. GENERATE INTERVIEW QUESTIONS ──────────────────────────────────────────
+def questions_prompt(session: dict, req: QuestionsRequest) -> dict:
     gap         = session.get("gap", {})
     target_role = session.get("target_role", "Software Engineer")
 
@@ -520,11 +2605,9 @@ Generate realistic, challenging interview questions tailored to the candidate's
 Mix: 2 technical questions + 1 behavioral. Make questions specific and thought-provoking.
 Return ONLY a valid JSON array."""
 
-    user = f"""Candidate: {profile.get('name','Candidate')}
-Target Role: {target_role}
-Their Skills: {', '.join(profile.get('skills', [])[:12])}
+    user = f"""Target Role: {target_role}
+{resume_digest(session)}
 Their Gaps: {', '.join([g['skill'] for g in gap.get('gaps', [])[:4]])}
-Experience: {', '.join([e.get('title','') for e in profile.get('experience', [])])}
 
 Generate {req.num_questions} questions. Return JSON array:
 [{{"id":1,"type":"technical","difficulty":"medium",
@@ -532,21 +2615,32 @@ Generate {req.num_questions} questions. Return JSON array:
    "what_they_test":"System design + scalability thinking",
    "good_answer_hints":["Mention hashing approach","Discuss database choice","Talk about caching strategy"]}}]"""
 
-    raw    = await ask_llm(system, user, temperature=0.5, max_tokens=1000, smart=True)
-    result = safe_json(raw)
-    if not isinstance(result, list):
-        result = [{"id":1,"type":"technical","difficulty":"medium",
-                   "question":f"Describe a challenging {target_role} project you built and the biggest technical obstacle you overcame.",
-                   "what_they_test":"Problem solving + communication","good_answer_hints":["Be specific","Mention trade-offs","Quantify impact"]}]
-    sessions[req.session_id]["current_questions"] = result
+    return build_prompt("generate-questions", system, user, temperature=0.5, max_tokens=1000, smart=True)
+
+
+def questions_finish(session: dict, req: QuestionsRequest, raw: str) -> dict:
+    target_role = session.get("target_role", "Software Engineer")
+    result      = parse_json("generate-questions", raw)
+    if not result:
+        result = rule_questions(session.get("profile", {}), session.get("gap", {}), target_role, req.num_questions)
+    ids = [q.get("id") for q in result]
+    if not all(ids) or len(set(ids)) < len(ids):   # answers and the live interview look questions up by id
+        for n, q in enumerate(result, 1): q["id"] = n
+    session["current_questions"] = result
     return {"questions": result, "role": target_role}
 
 
-# ── 5. EVALUATE ANSWER ────────────────────────────────────────────────────────
-@app.post("/evaluate-answer")
-async def evaluate_answer(req: EvaluateRequest):
-    session = sessions.get(req.session_id)
+@app.post("/generate-questions")
+async def generate_questions(req: QuestionsRequest):
+    session = await session_get(req.session_id)
     if not session: raise HTTPException(404, "Session not found.")
+    result  = questions_finish(session, req, await generate("generate-questions", session, req))
+    await session_put(req.session_id, session)
+    return result
+
+
+# ── 5. EVALUATE ANSWER ────────────────────────────────────────────────────────
+def evaluate_prompt(session: dict, req: EvaluateRequest) -> dict:
     target_role = session.get("target_role", "Software Engineer")
     profile     = session.get("profile", {})
 
@@ -557,8 +2651,8 @@ Return ONLY valid JSON."""
 
     user = f"""Role: {target_role}
 Candidate skills: {', '.join(profile.get('skills', [])[:8])}
-Question: {req.question}
-Candidate's Answer: {req.answer}
+Question: <<question>>
+Candidate's Answer: <<answer>>
 
 Evaluate and return JSON:
 {{"score":7,
@@ -569,9 +2663,13 @@ Evaluate and return JSON:
   "ideal_answer_summary":"A strong answer would include...",
   "follow_up_question":"How would you handle this at 10x the scale?"}}"""
 
-    raw    = await ask_llm(system, user, temperature=0.2, max_tokens=800)
-    result = safe_json(raw)
-    if not result:
+    return build_prompt("evaluate-answer", system, user, {"question": req.question, "answer": req.answer},
+                        temperature=0.2, max_tokens=800)
+
+
+def evaluate_finish(session: dict, req: EvaluateRequest, raw: str) -> dict:
+    result = parse_json("evaluate-answer", raw)
+    if result is None:
         result = {"score":6,"verdict":"Decent Answer",
                   "strengths":["Showed understanding of the concept"],
                   "improvements":["Add more specific examples","Mention trade-offs and alternatives"],
@@ -581,11 +2679,125 @@ Evaluate and return JSON:
     return result
 
 
-# ── 6. GENERATE PORTFOLIO PROJECTS ────────────────────────────────────────────
-@app.post("/generate-projects")
-async def generate_projects(req: ProjectsRequest):
-    session = sessions.get(req.session_id)
+@app.post("/evaluate-answer")
+async def evaluate_answer(req: EvaluateRequest):
+    session = await session_get(req.session_id)
     if not session: raise HTTPException(404, "Session not found.")
+    return evaluate_finish(session, req, await ask_llm(**evaluate_prompt(session, req)))
+
+
+# ── 5b. EVALUATE ANSWERS (BATCH) ──────────────────────────────────────────────
+# Several answers share one system prompt and candidate context. Items are packed
+# into chunks that fit the evaluate-batch input/output budgets; any item missing
+# or invalid in the batched reply is re-scored alone through /evaluate-answer.
+EVAL_ITEM_OUTPUT_TOKENS = 300   # reply tokens reserved per answer in a chunk
+_evaluation = TypeAdapter(Evaluation)
+
+
+def _batch_items(session: dict, req: EvaluateBatchRequest) -> list:
+    questions = [q for q in session.get("current_questions", []) if isinstance(q, dict)]
+    stored    = {q.get("id"): q.get("question", "") for q in questions}
+    items     = []
+    for pos, a in enumerate(req.answers):
+        qid = a.question_id if a.question_id is not None else pos + 1
+        if a.question:
+            text = a.question
+        elif a.question_id is not None:
+            if a.question_id not in stored: raise HTTPException(422, f"Answer {pos + 1}: no question with id {a.question_id}.")
+            text = stored[a.question_id]
+        else:
+            text = questions[pos].get("question", "") if pos < len(questions) else ""
+        if not text: raise HTTPException(422, f"No question found for answer {pos + 1}.")
+        items.append({"n": pos + 1, "id": qid, "question": text, "answer": a.answer})
+    return items
+
+
+def evaluate_batch_prompt(session: dict, items: list) -> dict:
+    target_role = session.get("target_role", "Software Engineer")
+    profile     = session.get("profile", {})
+
+    system = """You are a strict but fair technical interview evaluator at a top tech company.
+Evaluate each of the candidate's answers independently with specific, actionable feedback.
+Score honestly — a 10 requires an exceptional, complete answer with examples.
+Return ONLY a valid JSON array with one object per question, in the order given."""
+
+    blocks = "\n\n".join(f"### id {it['n']}\nQuestion: <<q{n}>>\nCandidate's Answer: <<a{n}>>" for n, it in enumerate(items))
+    user = f"""Role: {target_role}
+Candidate skills: {', '.join(profile.get('skills', [])[:8])}
+
+{blocks}
+
+Return JSON array:
+[{{"id":1,"score":7,
+   "score_breakdown":{{"technical_accuracy":7,"communication":8,"depth":6,"structure":7}},
+   "verdict":"Good Answer",
+   "strengths":["Mentioned correct approach"],
+   "improvements":["Could mention edge cases"],
+   "ideal_answer_summary":"A strong answer would include...",
+   "follow_up_question":"How would you handle this at 10x the scale?"}}]"""
+
+    fill = {f"q{n}": it["question"] for n, it in enumerate(items)} | {f"a{n}": it["answer"] for n, it in enumerate(items)}
+    return build_prompt("evaluate-batch", system, user, fill, temperature=0.2,
+                        max_tokens=EVAL_ITEM_OUTPUT_TOKENS * len(items))
+
+
+def _chunk_items(items: list) -> list:
+    budget = PROMPT_BUDGETS["evaluate-batch"]
+    per_chunk_out = max(1, budget["output"] // EVAL_ITEM_OUTPUT_TOKENS)
+    room = budget["input"] - 600                 # system prompt, context and reply template
+    chunks, cur, used = [], [], 0
+    for it in items:
+        cost = estimate_tokens(it["question"]) + estimate_tokens(it["answer"]) + 10
+        if cur and (len(cur) >= per_chunk_out or used + cost > room):
+            chunks.append(cur); cur, used = [], 0
+        cur.append(it); used += cost
+    return chunks + [cur] if cur else chunks
+
+
+async def _evaluate_chunk(session: dict, items: list) -> dict:
+    """item n → evaluation for every item the batched reply scored validly."""
+    try:
+        raw   = await ask_llm(**evaluate_batch_prompt(session, items))
+        reply = next((v for v in json_values(raw) if isinstance(v, list)), None)
+    except HTTPException:
+        raise
+    except Exception as e:
+        log.warning("batched evaluation failed: %r", e)
+        return {}
+    out, ns = {}, {it["n"] for it in items}
+    for pos, obj in enumerate(reply if isinstance(reply, list) else []):
+        if not isinstance(obj, dict): continue
+        n = obj.pop("id", items[pos]["n"] if pos < len(items) else None)
+        if n not in ns or n in out: continue
+        try:
+            out[n] = _evaluation.dump_python(_evaluation.validate_python(obj))
+        except ValidationError:
+            pass
+    return out
+
+
+@app.post("/evaluate-answers")
+async def evaluate_answers(req: EvaluateBatchRequest):
+    session = await session_get(req.session_id)
+    if not session: raise HTTPException(404, "Session not found.")
+    items  = _batch_items(session, req)
+    chunks = _chunk_items(items)
+    scored = {}
+    for part in await asyncio.gather(*(_evaluate_chunk(session, c) for c in chunks)):
+        scored.update(part)
+    missing = [it for it in items if it["n"] not in scored]
+
+    async def single(it):
+        sub = EvaluateRequest(session_id=req.session_id, question=it["question"], answer=it["answer"])
+        scored[it["n"]] = evaluate_finish(session, sub, await ask_llm(**evaluate_prompt(session, sub)))
+
+    await asyncio.gather(*(single(it) for it in missing))
+    return {"results": [{"question_id": it["id"], "question": it["question"], **scored[it["n"]]} for it in items],
+            "chunks": len(chunks), "fallbacks": len(missing)}
+
+
+# ── 6. GENERATE PORTFOLIO PROJECTS ────────────────────────────────────────────
+def projects_prompt(session: dict, req: ProjectsRequest) -> dict:
     profile     = session.get("profile", {})
     gap         = session.get("gap", {})
     target_role = session.get("target_role", "Developer")
@@ -609,26 +2821,29 @@ Generate 2 impressive portfolio projects. Return JSON array:
    "bonus_features":["Email notifications","Chrome extension"],
    "github_readme_tip":"Add live demo link and architecture diagram"}}]"""
 
-    raw    = await ask_llm(system, user, temperature=0.7, max_tokens=1500, smart=True)
-    result = safe_json(raw)
-    if not isinstance(result, list):
-        result = [{"title":f"{target_role} Portfolio App","tagline":"Showcase your skills",
-                   "difficulty":"Intermediate","time_to_build":"3 weeks",
-                   "tech_stack":profile.get("skills",["Python","React"])[:4],
-                   "why_impressive":"Demonstrates your full skill set to employers",
-                   "gap_it_closes":gap.get("missing_skills",["core skills"])[0] if gap.get("missing_skills") else "key skills",
-                   "steps":["Plan architecture","Build backend API","Create frontend","Add tests","Deploy publicly"],
-                   "bonus_features":["Add authentication","Write documentation"],
-                   "github_readme_tip":"Include a live demo link and screenshots"}]
-    sessions[req.session_id]["projects"] = result
+    return build_prompt("generate-projects", system, user, temperature=0.7, max_tokens=1500, smart=True)
+
+
+def projects_finish(session: dict, req: ProjectsRequest, raw: str) -> dict:
+    target_role = session.get("target_role", "Developer")
+    result      = parse_json("generate-projects", raw)
+    if not result:
+        result = rule_projects(session.get("profile", {}), session.get("gap", {}), target_role)
+    session["projects"] = result
     return {"projects": result}
 
 
-# ── 7. GENERATE SCHEDULE ──────────────────────────────────────────────────────
-@app.post("/generate-schedule")
-async def generate_schedule(req: ScheduleRequest):
-    session = sessions.get(req.session_id)
+@app.post("/generate-projects")
+async def generate_projects(req: ProjectsRequest):
+    session = await session_get(req.session_id)
     if not session: raise HTTPException(404, "Session not found.")
+    result  = projects_finish(session, req, await generate("generate-projects", session, req))
+    await session_put(req.session_id, session)
+    return result
+
+
+# ── 7. GENERATE SCHEDULE ──────────────────────────────────────────────────────
+def schedule_prompt(session: dict, req: ScheduleRequest) -> dict:
     gap         = session.get("gap", {})
     target_role = session.get("target_role", "Developer")
     courses     = gap.get("courses", [])
@@ -647,122 +2862,563 @@ Create a 4-week schedule. Return JSON:
     "tasks":[{{"title":"Docker Fundamentals","description":"Complete Docker crash course","day_offset":1,"duration_hours":2,"type":"course"}}]}}],
   "milestones":[{{"week":2,"goal":"Complete first course"}},{{"week":4,"goal":"Submit 5 applications"}}]}}"""
 
-    raw    = await ask_llm(system, user, temperature=0.4, max_tokens=1500, smart=True)
-    result = safe_json(raw)
-    if not result or "weeks" not in result:
-        result = {"title":f"4-Week {target_role} Roadmap","total_hours":40,
-                  "weeks":[{"week":i+1,"theme":f"Week {i+1}","focus":gaps_list[i] if i < len(gaps_list) else "Practice",
-                             "daily_hours":2,"tasks":[{"title":f"Study {gaps_list[i] if i < len(gaps_list) else 'core skills'}",
-                             "description":"Structured learning","day_offset":(i*7)+1,"duration_hours":2,"type":"course"}]}
-                            for i in range(4)],
-                  "milestones":[{"week":2,"goal":"Complete first course"},{"week":4,"goal":"Apply to 5 jobs"}]}
+    return build_prompt("generate-schedule", system, user, temperature=0.4, max_tokens=1500, smart=True)
+
+
+def schedule_finish(session: dict, req: ScheduleRequest, raw: str) -> dict:
+    target_role = session.get("target_role", "Developer")
+    result      = parse_json("generate-schedule", raw)
+    if result is None:
+        result = rule_schedule(session.get("gap", {}), target_role)
     ics_content = generate_ics(result.get("weeks", []))
-    sessions[req.session_id]["schedule"] = result
+    session["schedule"] = result
     return {"schedule": result, "ics_download": ics_content}
 
 
+@app.post("/generate-schedule")
+async def generate_schedule(req: ScheduleRequest):
+    session = await session_get(req.session_id)
+    if not session: raise HTTPException(404, "Session not found.")
+    result  = schedule_finish(session, req, await generate("generate-schedule", session, req))
+    await session_put(req.session_id, session)
+    return result
+
+
 # ── 8. FIND JOBS (NEW ★) ──────────────────────────────────────────────────────
 @app.post("/find-jobs")
 async def find_jobs(req: FindJobsRequest):
-    session = sessions.get(req.session_id)
+    session = await session_get(req.session_id)
     if not session: raise HTTPException(404, "Session not found.")
+    return await job_matches(session, req)
+
+
+async def job_matches(session: dict, req: FindJobsRequest) -> dict:
     target_role = session.get("target_role", "Software Engineer")
     profile     = session.get("profile", {})
     gap         = session.get("gap", {})
-    top_skills  = profile.get("skills", [])[:5]
-    location    = req.location or session.get("preferences", {}).get("location", "India")
+    location    = req.location or session.get("preferences", {}).get("location") or "India"
 
-    # ── Try Adzuna real API first ──────────────────────────────────────────────
+    # ── Try Adzuna real API first (cached, re-ranked for this candidate) ───────
     if ADZUNA_APP_ID and ADZUNA_APP_KEY:
         try:
-            country = "in"   # India
-            query   = target_role.replace(" ", "+")
-            loc     = location.replace(" ", "+")
-            url = (
-                f"https://api.adzuna.com/v1/api/jobs/{country}/search/1"
-                f"?app_id={ADZUNA_APP_ID}&app_key={ADZUNA_APP_KEY}"
-                f"&results_per_page={req.num_results}&what={query}&where={loc}"
-                f"&content-type=application/json"
-            )
-            async with httpx.AsyncClient(timeout=10) as client:
-                r = await client.get(url)
-                if r.status_code == 200:
-                    data   = r.json()
-                    jobs_raw = data.get("results", [])
-                    jobs = []
-                    for j in jobs_raw[:req.num_results]:
-                        jobs.append({
-                            "title":       j.get("title",""),
-                            "company":     j.get("company", {}).get("display_name",""),
-                            "location":    j.get("location", {}).get("display_name",""),
-                            "salary":      f"£{j.get('salary_min',0):,.0f}–£{j.get('salary_max',0):,.0f}" if j.get("salary_min") else "Competitive",
-                            "type":        "Full-time",
-                            "logo":        "🏢",
-                            "apply_url":   j.get("redirect_url","#"),
-                            "posted":      "Recently",
-                            "description": (j.get("description","")[:120]+"...") if j.get("description") else "",
-                            "match":       max(70, gap.get("matchScore",70)),
-                            "source":      "Adzuna"
-                        })
-                    if jobs:
-                        return {"jobs": jobs, "source": "adzuna", "role": target_role, "location": location}
-        except Exception:
-            pass   # Fall through to mock
-
-    # ── Smart mock fallback (personalised by role + match score) ─────────────
-    base_jobs = MOCK_JOBS.get(target_role, DEFAULT_JOBS)
-    match_score = gap.get("matchScore", 70)
-
-    # Sort by match % relevance and personalise slightly
-    jobs = []
-    for j in base_jobs[:req.num_results]:
-        personalized_match = min(99, j["match"] + (match_score - 70) // 5)
-        jobs.append({**j, "match": max(50, personalized_match),
-                     "skills_matched": top_skills[:3], "source": "mock"})
-
-    jobs.sort(key=lambda x: x["match"], reverse=True)
+            index = await job_cache.get(target_role, location, req.page)
+            if len(index):
+                jobs = index.rank(profile.get("skills", []), req.num_results, max(70, gap.get("matchScore", 70)))
+                return {"jobs": jobs, "source": "adzuna", "role": target_role, "location": location, "page": req.page}
+        except UpstreamUnavailable:
+            pass   # breaker open — go straight to mock
+        except Exception as e:
+            log.warning("Adzuna request failed for %r in %r: %r", target_role, location, e)
+
+    # ── Smart mock fallback (ranked against the candidate's skills) ──────────
+    index = MOCK_INDEX.get(target_role, DEFAULT_MOCK_INDEX)
+    jobs  = [{**j, "source": "mock"} for j in index.rank(profile.get("skills", []), req.num_results, gap.get("matchScore", 70))]
     return {"jobs": jobs, "source": "mock", "role": target_role, "location": location,
             "tip": "Set ADZUNA_APP_ID + ADZUNA_APP_KEY in .env for live job data"}
 
 
 # ── 9. AGENTIC CHAT ────────────────────────────────────────────────────────────
-@app.post("/chat")
-async def chat(req: ChatRequest):
-    session = sessions.get(req.session_id)
-    if not session: raise HTTPException(404, "Session not found.")
-    profile     = session.get("profile", {})
+def chat_prompt(session: dict, req: ChatRequest) -> dict:
     gap         = session.get("gap", {})
     target_role = session.get("target_role", "")
     history     = session.get("messages", [])
-    hist_str    = "\n".join([f"{'User' if m['role']=='user' else 'Assistant'}: {m['content'][:200]}" for m in history[-6:]])
+    hist_str    = "\n".join([f"{'User' if m['role']=='user' else 'Assistant'}: {m['content']}" for m in history[-CHAT_WINDOW:]])
+    memory      = f"\nEarlier in this conversation: {session['memory']}" if session.get("memory") else ""
 
     system = f"""You are VidyaGuide, an elite AI career mentor.
 
-Candidate: {profile.get('name','Student')} | Role: {target_role}
-Skills: {', '.join(profile.get('skills',[])[:10])}
+Role: {target_role}
+{resume_digest(session)}
 Top Gaps: {', '.join([g['skill'] for g in gap.get('gaps',[])[:4]])}
 Match Score: {gap.get('matchScore','?')}%
-Summary: {gap.get('summary','')}
+Summary: {gap.get('summary','')}{memory}
 
 Be specific, actionable, and encouraging. Reference their actual skills.
 Keep responses under 150 words unless asked for detail.
 Use **bold** for emphasis and bullet points when listing items."""
 
-    user_msg  = f"{hist_str}\nUser: {req.message}" if hist_str else req.message
-    reply     = await ask_llm(system, user_msg, temperature=0.5, max_tokens=400)
+    user_msg = "<<history_tail>>\nUser: <<message>>" if hist_str else "<<message>>"
+    return build_prompt("chat", system, user_msg, {"history_tail": hist_str, "message": req.message},
+                        temperature=0.5, max_tokens=400)
+
+
+def chat_finish(session: dict, req: ChatRequest, reply: str) -> dict:
+    gap = session.get("gap", {})
     if not reply:
         reply = f"Focus on learning {gap.get('gaps',[{}])[0].get('skill','required skills')} first. Start with a structured course this week."
-    session["messages"] += [{"role":"user","content":req.message},{"role":"assistant","content":reply}]
-    return {"reply": reply, "model": MODEL_NAME}
+    messages = session["messages"] + [{"role":"user","content":req.message},{"role":"assistant","content":reply}]
+    if len(messages) > CHAT_WINDOW:
+        # ring buffer: older turns move to a queue that fold_chat_memory summarises in the background
+        session["memory_pending"] = session.get("memory_pending", []) + messages[:-CHAT_WINDOW]
+        messages = messages[-CHAT_WINDOW:]
+        schedule_memory_fold(req.session_id)
+    session["messages"] = messages
+    return {"reply": reply, "model": served_model()}
+
+
+_folding: set = set()
 
 
+def schedule_memory_fold(sid: str):
+    # runs after the caller's session_put(): the task only starts at the next await, and
+    # the SQLite store runs its calls in the order they were made
+    if sid not in _folding:
+        _folding.add(sid)
+        asyncio.get_running_loop().create_task(fold_chat_memory(sid))
+
+
+async def fold_chat_memory(sid: str):
+    """Fold turns that left the chat window into session["memory"], a short running summary."""
+    try:
+        session = await session_get(sid)
+        pending = (session or {}).get("memory_pending", [])
+        if not pending: return
+        turns = "\n".join(f"{'User' if m['role']=='user' else 'Assistant'}: {m['content']}" for m in pending)
+        try:
+            memory = await ask_llm(**build_prompt(
+                "chat-memory",
+                "You maintain a compact memory of a career-mentoring chat. Merge the new turns into the existing "
+                "memory. Keep facts, goals, decisions and advice given. Under 80 words, plain text.",
+                f"Existing memory: {session.get('memory') or '(none)'}\n\nNew turns:\n<<turns>>", {"turns": turns},
+                temperature=0.2, max_tokens=160))
+        except Exception:
+            asked  = "; ".join(m["content"][:80] for m in pending if m["role"] == "user")
+            memory = f"{session.get('memory', '')} User asked about: {asked}".strip()[-600:]
+        session = await session_get(sid)   # re-read: the chat may have moved on while we waited
+        if not session: return
+        # drop exactly the turns folded above; anything queued meanwhile stays for the next fold
+        folded, rest = list(pending), []
+        for m in session.get("memory_pending", []):
+            if m in folded: folded.remove(m)
+            else: rest.append(m)
+        session["memory"], session["memory_pending"] = memory, rest
+        await session_put(sid, session)
+    finally:
+        _folding.discard(sid)
+        if (s := await session_get(sid)) and s.get("memory_pending"):
+            schedule_memory_fold(sid)
+
+
+@app.post("/chat")
+async def chat(req: ChatRequest):
+    session = await session_get(req.session_id)
+    if not session: raise HTTPException(404, "Session not found.")
+    reply   = await ask_llm(**chat_prompt(session, req))
+    session = await session_get(req.session_id)   # re-read: a memory fold may have landed while we waited
+    if not session: raise HTTPException(404, "Session not found.")
+    result  = chat_finish(session, req, reply)
+    await session_put(req.session_id, session)
+    return result
+
+
+# ── 10. STREAMING (SSE) ───────────────────────────────────────────────────────
+# Same prompts as above; tokens are forwarded as they arrive and session state is
+# written by the *_finish step only after the stream completes.
+STREAMERS = {
+    "chat":               (ChatRequest,      chat_prompt,      chat_finish),
+    "tailor-resume":      (TailorRequest,    tailor_prompt,    tailor_finish),
+    "generate-questions": (QuestionsRequest, questions_prompt, questions_finish),
+    "evaluate-answer":    (EvaluateRequest,  evaluate_prompt,  evaluate_finish),
+    "generate-projects":  (ProjectsRequest,  projects_prompt,  projects_finish),
+    "generate-schedule":  (ScheduleRequest,  schedule_prompt,  schedule_finish),
+}
+
+
+def sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _prepend(first: str, rest):
+    if first: yield first
+    async for piece in rest: yield piece
+
+
+async def _single(text: str):
+    yield text
+
+
+def make_stream_route(name: str):
+    model_cls, prompt_fn, finish_fn = STREAMERS[name]
+
+    async def route(req: model_cls):
+        session = await session_get(req.session_id)
+        if not session: raise HTTPException(404, "Session not found.")
+        prompt = prompt_fn(session, req)
+        ready  = (await pregen.take(req.session_id, name, prompt) if name in PREGEN_ENDPOINTS else None) \
+                 or rule_output(name, session, req, prompt)
+        tokens = _single(ready) if ready else ask_llm_stream(**prompt)
+        first  = await anext(tokens, "")   # surface config/Groq errors as HTTP errors, not mid-stream
+
+        async def events():
+            parts, scanner = [], (JsonStreamScanner() if name != "chat" else None)
+            async for piece in _prepend(first, tokens):
+                parts.append(piece)
+                yield sse("token", {"text": piece})
+                for part in (scanner.feed(piece) if scanner else []):
+                    yield sse("part", part)
+            raw    = await ensure_json(name, "".join(parts).strip())
+            fresh  = await session_get(req.session_id)   # re-read: e.g. a chat memory fold may have landed meanwhile
+            result = finish_fn(fresh or session, req, raw)
+            if fresh is not None: await session_put(req.session_id, fresh)
+            yield sse("done", result)
+
+        return StreamingResponse(events(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    route.__name__ = name.replace("-", "_") + "_stream"
+    return route
+
+
+for _name in STREAMERS:
+    app.post(f"/{_name}/stream")(make_stream_route(_name))
+
+
+# ── 11. BACKGROUND TASKS ──────────────────────────────────────────────────────
+# POST /<endpoint>/async returns 202 + task id; poll GET /tasks/{id} (?wait=<s>
+# long-polls) or subscribe to GET /tasks/{id}/events. Each session keeps the
+# timing of its last few tasks under "tasks".
+TASK_ENDPOINTS = ("generate-projects", "generate-schedule")
+SESSION_TASK_HISTORY = 20
+
+
+def _task_runner(name: str, req):
+    finish_fn = STREAMERS[name][2]
+
+    async def run(rec: dict):
+        session = await session_get(req.session_id)
+        if not session: raise HTTPException(404, "Session not found.")
+        raw = await generate(name, session, req)
+        session = await session_get(req.session_id)      # re-read: the session may have changed while generating
+        if not session: raise HTTPException(404, "Session not found.")
+        result = finish_fn(session, req, raw)
+        timing = {k: rec[k] for k in ("id", "kind", "submitted_at", "queue_ms")}
+        timing["run_ms"] = round(1000 * (time.time() - rec["started_at"]), 1)
+        session["tasks"] = (session.get("tasks", []) + [timing])[-SESSION_TASK_HISTORY:]
+        await session_put(req.session_id, session)
+        return result
+
+    return run
+
+
+def make_task_route(name: str):
+    model_cls = STREAMERS[name][0]
+
+    async def route(req: model_cls):
+        if not await session_get(req.session_id): raise HTTPException(404, "Session not found.")
+        rec = task_queue.submit(name, req.session_id, _task_runner(name, req))
+        return {"task_id": rec["id"], "status": rec["status"],
+                "poll": f"/tasks/{rec['id']}", "events": f"/tasks/{rec['id']}/events"}
+
+    route.__name__ = name.replace("-", "_") + "_async"
+    return route
+
+
+for _name in TASK_ENDPOINTS:
+    app.post(f"/{_name}/async", status_code=202)(make_task_route(_name))
+
+
+def _task_or_404(task_id: str) -> dict:
+    rec = task_queue.get(task_id)
+    if rec is None: raise HTTPException(404, "Task not found.")
+    return rec
+
+
+@app.get("/tasks/{task_id}")
+async def get_task(task_id: str, wait: float = 0):
+    rec = _task_or_404(task_id)
+    if wait > 0: await task_queue.wait(rec, min(wait, 30))
+    return task_queue.public(rec)
+
+
+@app.get("/tasks/{task_id}/events")
+async def task_events(task_id: str):
+    rec = _task_or_404(task_id)
+
+    async def events():
+        last, idle = None, 0
+        while True:
+            if rec["status"] != last:
+                last, idle = rec["status"], 0
+                yield sse("status", {"status": last, "queue_ms": rec["queue_ms"]})
+            if rec["_done"].is_set(): break
+            await task_queue.wait(rec, 1)
+            idle += 1
+            if idle % 15 == 0: yield ": keep-alive\n\n"
+        yield sse("done", task_queue.public(rec))
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.delete("/tasks/{task_id}")
+async def cancel_task(task_id: str):
+    rec = task_queue.cancel(_task_or_404(task_id)["id"])
+    await task_queue.wait(rec, 1)       # let a running task unwind so the reply shows "cancelled"
+    return task_queue.public(rec)
+
 @app.get("/session/{sid}")
-def get_session(sid: str):
-    s = sessions.get(sid)
+async def get_session(sid: str):
+    s = await session_get(sid)
     if not s: raise HTTPException(404,"Not found.")
     return {"profile":s.get("profile",{}),"gap":s.get("gap",{}),"target_role":s.get("target_role","")}
 
 @app.delete("/session/{sid}")
-def clear_session(sid: str):
-    if sid in sessions: del sessions[sid]
-    return {"message":"Cleared."}
\ No newline at end of file
+async def clear_session(sid: str):
+    pregen.invalidate(sid)
+    await session_delete(sid)
+    return {"message":"Cleared."}
+
+
+# ── 12. FULL REPORT ───────────────────────────────────────────────────────────
+# One call instead of five: analyze once, then questions/projects/schedule/jobs run
+# concurrently. Each branch streams as its own SSE event when it lands; a branch
+# that errors or exceeds REPORT_BRANCH_TIMEOUT reports an error without holding up
+# the others. Session state from every finished branch is saved at the end.
+def _report_branches(session: dict, req: FullReportRequest) -> dict:
+    sid = req.session_id
+
+    async def llm(endpoint, sub):
+        return STREAMERS[endpoint][2](session, sub, await generate(endpoint, session, sub))
+
+    return {
+        "questions": lambda: llm("generate-questions", QuestionsRequest(session_id=sid, num_questions=req.num_questions)),
+        "projects":  lambda: llm("generate-projects", ProjectsRequest(session_id=sid)),
+        "schedule":  lambda: llm("generate-schedule", ScheduleRequest(session_id=sid)),
+        "jobs":      lambda: job_matches(session, FindJobsRequest(session_id=sid, location=req.location,
+                                                                  num_results=req.num_results)),
+    }
+
+
+@app.post("/full-report")
+async def full_report(req: FullReportRequest):
+    session = await session_get(req.session_id)
+    if not session: raise HTTPException(404, "Session not found.")
+    t0 = time.monotonic()
+    profile, gap = apply_analysis(session, req)
+    await session_put(req.session_id, session)
+    done: asyncio.Queue = asyncio.Queue()
+
+    async def branch(name: str, make):
+        start = time.monotonic()
+        try:
+            event = {"branch": name, "result": await asyncio.wait_for(make(), REPORT_BRANCH_TIMEOUT)}
+        except asyncio.TimeoutError:
+            event = {"branch": name, "error": f"timed out after {REPORT_BRANCH_TIMEOUT:g}s"}
+        except HTTPException as e:
+            event = {"branch": name, "error": e.detail}
+        except Exception as e:
+            log.warning("full-report branch %s failed: %r", name, e)
+            event = {"branch": name, "error": str(e) or type(e).__name__}
+        event["ms"] = round(1000 * (time.monotonic() - start), 1)
+        await done.put(event)
+
+    async def events():
+        yield sse("analyze", {"session_id": req.session_id, "profile": profile, "gap_analysis": gap})
+        branches = _report_branches(session, req)
+        fan_out  = asyncio.ensure_future(asyncio.gather(*(branch(n, m) for n, m in branches.items())))
+        status   = {}
+        try:
+            for _ in branches:
+                event = await done.get()
+                status[event["branch"]] = "error" if "error" in event else "ok"
+                yield sse("branch", event)
+        finally:
+            fan_out.cancel()
+            await session_put(req.session_id, session)
+        yield sse("done", {"branches": status, "ms": round(1000 * (time.monotonic() - t0), 1)})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# ── 13. LIVE INTERVIEW (WEBSOCKET) ────────────────────────────────────────────
+# /ws/interview/{sid} keeps the session in memory for the whole interview.
+# Client → server (JSON):
+#   {"type":"start","num_questions":3,"regenerate":false}
+#   {"type":"partial","question_id":1,"text":"interim transcript…"}
+#   {"type":"answer","question_id":1,"text":"final transcript"}
+#   {"type":"end"}
+# Server → client: "questions", "token" (evaluation stream), "follow_up",
+# "evaluation", "summary" and "error" messages. Partial transcripts trigger a
+# follow-up question on the fast model while the candidate is still speaking;
+# if the final answer is mostly what that guess saw, the follow-up is sent the
+# moment the answer arrives instead of after the evaluation.
+interview_stats = Counter()
+
+
+async def follow_up_question(question: str, answer: str) -> str:
+    reply = await ask_llm(**build_prompt(
+        "interview-follow-up",
+        "You are a senior technical interviewer. Given a question and the candidate's answer (possibly "
+        "still in progress), ask ONE short, probing follow-up question. Return only the question.",
+        "Question: <<question>>\nCandidate's answer so far: <<answer>>", {"question": question, "answer": answer},
+        temperature=0.4, max_tokens=80))
+    return reply.strip().split("\n")[0].strip(' "')
+
+
+def invalid_message(e: ValueError) -> str:
+    if isinstance(e, ValidationError):
+        err = e.errors()[0]
+        return f"Invalid {'.'.join(map(str, err['loc'])) or 'message'}: {err['msg']}."
+    return f"Invalid message: {e}"
+
+
+class LiveInterview:
+    def __init__(self, sid: str, session: dict, ws: WebSocket):
+        self.sid, self.session, self.ws = sid, session, ws
+        self.questions = session.get("current_questions") or []
+        self.spec: dict = {}          # question_id → (words seen, follow-up task)
+        self.pending: set = set()     # answer tasks still streaming
+        self.scores: list = []
+        self.lock = asyncio.Lock()
+
+    async def save(self, update):
+        """Apply update to a fresh read of the session and write that back.
+
+        The socket can stay open for many minutes; writing back the copy loaded at
+        connect time would undo whatever other routes changed meanwhile (chat memory,
+        a new analysis).
+        """
+        fresh = await session_get(self.sid)
+        if fresh is None: return   # cleared while the interview ran
+        update(fresh)
+        await session_put(self.sid, fresh)
+        self.session = fresh
+
+    async def send(self, kind: str, **data):
+        async with self.lock:
+            await self.ws.send_json({"type": kind, **data})
+
+    def question(self, msg: dict) -> str:
+        if msg.get("question"): return msg["question"]
+        qid = msg.get("question_id")
+        return next((q.get("question", "") for q in self.questions if q.get("id") == qid), "")
+
+    async def run(self):
+        while True:
+            # a malformed message gets an "error" reply instead of closing the socket with 1011
+            try:
+                msg = await self.ws.receive_json()
+                if not isinstance(msg, dict): raise ValueError("Messages must be JSON objects.")
+                if await self.handle(msg): return
+            except (ValueError, ValidationError) as e:
+                await self.send("error", detail=invalid_message(e))
+
+    async def handle(self, msg: dict) -> bool:
+        """Dispatch one client message; True once the interview has ended."""
+        kind = msg.get("type")
+        if kind == "start":
+            await self.start(msg)
+        elif kind == "partial":
+            self.speculate(msg)
+        elif kind == "answer":
+            task = asyncio.get_running_loop().create_task(self.answer(msg))
+            self.pending.add(task)
+            task.add_done_callback(self._answer_done)
+        elif kind == "end":
+            await asyncio.gather(*self.pending, return_exceptions=True)
+            scores = [s for s in self.scores if isinstance(s, (int, float))]
+            await self.send("summary", answered=len(self.scores),
+                            average_score=round(sum(scores) / len(scores), 1) if scores else None)
+            return True
+        else:
+            await self.send("error", detail=f"Unknown message type {kind!r}.")
+        return False
+
+    def _answer_done(self, task: asyncio.Task):
+        self.pending.discard(task)
+        if not task.cancelled() and (e := task.exception()):
+            log.error("live interview answer failed", exc_info=e)
+
+    async def start(self, msg: dict):
+        if msg.get("regenerate") or not self.questions:
+            req = QuestionsRequest(session_id=self.sid, num_questions=msg.get("num_questions", 3))
+            try:
+                result = questions_finish(self.session, req, await generate("generate-questions", self.session, req))
+            except HTTPException as e:
+                return await self.send("error", detail=e.detail)
+            self.questions = result["questions"]
+            await self.save(lambda s: s.update(current_questions=self.questions))
+        await self.send("questions", questions=self.questions)
+
+    def speculate(self, msg: dict):
+        qid, text = msg.get("question_id"), msg.get("text", "")
+        if not isinstance(text, str) or isinstance(qid, (list, dict)):
+            raise ValueError("partial needs a string text and a scalar question_id.")
+        words, prev = len(text.split()), self.spec.get(qid)
+        if words < FOLLOWUP_MIN_WORDS or (prev and words - prev[0] < FOLLOWUP_STEP_WORDS): return
+        if not (question := self.question(msg)): return
+        if prev: prev[1].cancel()
+        interview_stats["speculated"] += 1
+        self.spec[qid] = (words, asyncio.get_running_loop().create_task(follow_up_question(question, text)))
+
+    def follow_up_task(self, qid, question: str, answer: str) -> asyncio.Task:
+        spec = self.spec.pop(qid, None)
+        if spec and not spec[1].cancelled() and spec[0] >= FOLLOWUP_REUSE_RATIO * len(answer.split()):
+            interview_stats["speculation_used"] += 1
+            return spec[1]
+        if spec:
+            interview_stats["speculation_discarded"] += 1
+            spec[1].cancel()
+        return asyncio.get_running_loop().create_task(follow_up_question(question, answer))
+
+    async def answer(self, msg: dict):
+        qid, text = msg.get("question_id"), msg.get("text", "")
+        if not (question := self.question(msg)):
+            return await self.send("error", question_id=qid, detail="Unknown question.")
+        try:
+            req = EvaluateRequest(session_id=self.sid, question=question, answer=text)
+        except ValidationError as e:
+            return await self.send("error", question_id=qid, detail=invalid_message(e))
+        interview_stats["answers"] += 1
+        follow = self.follow_up_task(qid, question, text)
+
+        async def deliver_follow_up():
+            try:
+                q = await follow
+            except Exception:
+                return None
+            if q: await self.send("follow_up", question_id=qid, question=q)
+            return q
+
+        sender = asyncio.get_running_loop().create_task(deliver_follow_up())
+        try:
+            parts = []
+            async for piece in ask_llm_stream(**evaluate_prompt(self.session, req)):
+                parts.append(piece)
+                await self.send("token", question_id=qid, text=piece)
+            result = evaluate_finish(self.session, req, await ensure_json("evaluate-answer", "".join(parts).strip()))
+        except Exception as e:
+            sender.cancel()
+            interview_stats["answer_errors"] += 1
+            if not isinstance(e, HTTPException): log.warning("live interview evaluation failed: %r", e)
+            return await self.send("error", question_id=qid,
+                                   detail=e.detail if isinstance(e, HTTPException) else "Evaluation failed, please retry.")
+        if q := await sender:
+            result["follow_up_question"] = q
+        self.scores.append(result.get("score"))
+        entry = {"question": question, "score": result.get("score"), "at": time.time()}
+        await self.save(lambda s: s.update(interview=(s.get("interview", []) + [entry])[-20:]))
+        await self.send("evaluation", question_id=qid, result=result)
+
+    def close(self):
+        for _, task in self.spec.values(): task.cancel()
+        for task in self.pending: task.cancel()
+
+
+@app.websocket("/ws/interview/{sid}")
+async def interview_ws(ws: WebSocket, sid: str):
+    session = await session_get(sid)
+    if not session:
+        await ws.close(code=4404, reason="Session not found.")
+        return
+    await ws.accept()
+    interview_stats["sessions"] += 1
+    interview = LiveInterview(sid, session, ws)
+    try:
+        await interview.run()
+        await ws.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        interview.close()